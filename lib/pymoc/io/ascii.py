@@ -1,5 +1,5 @@
 # Copyright (C) 2014 Science and Technology Facilities Council.
-# Copyright (C) 2017 East Asian Observatory.
+# Copyright (C) 2017-2026 East Asian Observatory.
 #
 # This program is free software: you can redistribute it and/or modify
 # it under the terms of the GNU General Public License as published by
@@ -16,85 +16,180 @@
 
 from __future__ import unicode_literals
 
+from codecs import getwriter
+from io import BufferedIOBase, RawIOBase
 
-def write_moc_ascii(moc, filename=None, file=None):
-    """Write a MOC to an ASCII file.
+import numpy as np
 
-    Either a filename, or an open file object can be specified.
-    """
+from ..ranges import MAX_ORDER
+from .compression import open_file
+
+# Formats for ranges of two or more cells, indexed by the number of
+# cells in the range (with 3 representing any longer range).
+_range_formats = (None, None, '%d,%d', '%d-%d')
 
-    orders = []
+# Number of ranges to format at a time when writing.
+write_chunk_size = 10000
 
-    for (order, cells) in moc:
-        ranges = []
-        rmin = rmax = None
+# Number of characters to read from the file at a time.
+read_buffer_size = 65536
 
-        for cell in sorted(cells):
-            if rmin is None:
-                rmin = rmax = cell
-            elif rmax == cell - 1:
-                rmax = cell
-            else:
-                ranges.append(_format_range(rmin, rmax))
-                rmin = rmax = cell
+# Number of cells or ranges to accumulate before adding them to the MOC.
+read_batch_size = 100000
 
-        ranges.append(_format_range(rmin, rmax))
 
-        orders.append('{0}'.format(order) + '/' + ','.join(ranges))
+def write_moc_ascii(moc, filename=None, file=None):
+    """Write a MOC to an ASCII file.
+
+    Either a filename, or an open file object can be specified.
+    If the filename ends with ".gz", ".bz2" or ".xz", the file
+    will be compressed.  The file object can be opened in either
+    text or binary mode.
+
+    The output for each order is generated from its ranges of cells,
+    and written to the file in chunks.
+    """
 
     if file is not None:
-        _write_ascii(orders, file)
+        if isinstance(file, (RawIOBase, BufferedIOBase)):
+            file = getwriter('ascii')(file)
+
+        _write_ascii(moc, file)
     else:
-        with open(filename, 'w') as f:
-            _write_ascii(orders, f)
+        with open_file(filename, 'w') as f:
+            _write_ascii(moc, f)
 
 
 def read_moc_ascii(moc, filename=None, file=None):
     """Read from an ASCII file into a MOC.
 
     Either a filename, or an open file object can be specified.
+    A file compressed with gzip, bzip2 or xz will be decompressed
+    as it is read.
+
+    The file is read in buffered chunks and ranges of cells are
+    added to the MOC as ranges, so the memory required depends on the
+    number of ranges rather than the number of cells.  In addition to the
+    MOC 1 form, in which the cells for each order are separated by commas,
+    the MOC 2.0 form is accepted, where cells can be separated by any
+    whitespace and each order can be split over multiple lines.
     """
 
     if file is not None:
-        orders = _read_ascii(file)
+        _read_ascii(moc, file)
     else:
-        with open(filename, 'r') as f:
-            orders = _read_ascii(f)
+        with open_file(filename, 'r') as f:
+            _read_ascii(moc, f)
 
-    for text in orders:
-        if not text:
-            continue
 
-        cells = []
-        (order, ranges) = text.split('/')
+def _write_ascii(moc, f):
+    separator = ''
 
-        if not ranges:
+    for order in range(0, MAX_ORDER + 1):
+        ranges = moc.get_ranges(order)
+
+        if not ranges.size:
             continue
 
-        for r in ranges.split(','):
-            try:
-                cells.append(int(r))
-            except ValueError as e:
-                (rmin, rmax) = r.split('-')
-                cells.extend(range(int(rmin), int(rmax) + 1))
+        f.write(separator + '{0}/'.format(order))
+        separator = ' '
 
-        moc.add(order, cells)
+        for start in range(0, len(ranges), write_chunk_size):
+            chunk = ranges[start:start + write_chunk_size]
 
+            if start:
+                f.write(',')
 
-def _write_ascii(orders, f):
-    f.write(' '.join(orders))
+            f.write(_format_ranges(chunk))
 
 
-def _read_ascii(f):
-    text = f.read()
+def _read_ascii(moc, f):
+    order = None
+    cells = []
+    ranges = []
 
-    return text.strip().split(' ')
+    for token in _read_ascii_tokens(f):
+        if '/' in token:
+            _add_ascii_cells(moc, order, cells, ranges)
+            (order, token) = token.split('/')
 
+            # An order may be given with no cells (e.g. to indicate
+            # the MOCORDER).
+            if not token:
+                continue
 
-def _format_range(rmin, rmax):
-    if rmin == rmax:
-        return '{0}'.format(rmin)
-    elif rmax == rmin + 1:
-        return '{0},{1}'.format(rmin, rmax)
-    else:
-        return '{0}-{1}'.format(rmin, rmax)
+        elif order is None:
+            raise ValueError('MOC cells given before order')
+
+        if '-' in token:
+            (rmin, rmax) = token.split('-')
+            ranges.append((int(rmin), int(rmax) + 1))
+        else:
+            cells.append(int(token))
+
+        if len(cells) + len(ranges) >= read_batch_size:
+            _add_ascii_cells(moc, order, cells, ranges)
+
+    _add_ascii_cells(moc, order, cells, ranges)
+
+
+def _read_ascii_tokens(f):
+    """Generate the tokens of an ASCII MOC from an open file.
+
+    Tokens are separated by commas or whitespace.  The file is read
+    in chunks, and a token which may be split between chunks is kept
+    to be combined with the start of the next chunk.  The file may
+    be opened in either text or binary mode.
+    """
+
+    partial = ''
+
+    while True:
+        text = f.read(read_buffer_size)
+
+        if not text:
+            break
+
+        if isinstance(text, bytes):
+            text = text.decode('ascii')
+
+        tokens = (partial + text).replace(',', ' ').split()
+
+        if tokens and not text[-1].isspace() and text[-1] != ',':
+            partial = tokens.pop()
+        else:
+            partial = ''
+
+        for token in tokens:
+            yield token
+
+    if partial:
+        yield partial
+
+
+def _add_ascii_cells(moc, order, cells, ranges):
+    """Add accumulated cells and ranges to the MOC and clear the lists."""
+
+    if cells:
+        moc.add(order, cells)
+        del cells[:]
+
+    if ranges:
+        moc.add_ranges(order, ranges)
+        del ranges[:]
+
+
+def _format_ranges(ranges):
+    """Format an array of cell ranges for ASCII output.
+
+    Ranges of one or two cells are written as individual cells,
+    and longer ranges as "first-last".
+    """
+
+    kinds = np.minimum(ranges[:, 1] - ranges[:, 0], 3).tolist()
+    firsts = ranges[:, 0].tolist()
+    lasts = (ranges[:, 1] - 1).tolist()
+
+    return ','.join([
+        ('%d' % first) if kind == 1 else (_range_formats[kind] % (first, last))
+        for (first, last, kind) in zip(firsts, lasts, kinds)])
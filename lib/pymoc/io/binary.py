@@ -0,0 +1,263 @@
+# Copyright (C) 2026 East Asian Observatory.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Native binary MOC format.
+
+This is a simple format intended for quickly loading MOCs written by
+this package.  A file consists of a 32 byte header followed by
+an array of little-endian 64-bit integers.  The header contains:
+
+* The identifier ``PYMOCBIN``.
+* The format version (16-bit).
+* The encoding: 0 for RANGE or 1 for NUNIQ (8-bit).
+* Flags: 1 if a checksum is present, 2 if the MOC was normalized (8-bit).
+* The number of integers in the array (64-bit).
+* The CRC-32 checksum of the array, or 0 (32-bit).
+* Padding (8 bytes).
+
+With the RANGE encoding, the array begins with 31 offsets
+(in units of ranges) giving the position of the range set for
+each order, followed by the range sets themselves
+(as described in :mod:`pymoc.ranges`).  This is the form in which
+a MOC stores its cells, so the data can be used directly from
+a memory-mapped file without being copied.  With the NUNIQ
+encoding, the array contains sorted NUNIQ values.
+"""
+
+from __future__ import absolute_import
+
+import struct
+from zlib import crc32
+
+import numpy as np
+
+from ..moc import MOC
+from ..ranges import MAX_ORDER
+from .compression import compression_from_contents, compression_from_name, \
+    is_file_object, open_file
+
+ENCODINGS = ('RANGE', 'NUNIQ')
+
+_magic = b'PYMOCBIN'
+_version = 1
+_header = struct.Struct('<8sHBBQI8x')
+_value_type = np.dtype('<i8')
+
+_flag_checksum = 1
+_flag_normalized = 2
+
+# Number of NUNIQ values to write at a time.
+write_chunk_size = 1000000
+
+
+def write_moc_binary(moc, filename, encoding='RANGE', checksum=False):
+    """Write a MOC to a file in the native binary format.
+
+    The `encoding` can be "RANGE" (the default) or "NUNIQ".
+    If `checksum` is specified, a CRC-32 checksum of the data
+    is included in the header.
+
+    A seekable binary file object can be given instead of a file name.
+    Compressed files can not be written, so the file name must not
+    have a compression extension (such as ".gz").
+    """
+
+    encoding = _validate_encoding(encoding)
+
+    if is_file_object(filename):
+        _write_binary(moc, filename, encoding, checksum)
+    else:
+        if compression_from_name(filename)[1] is not None:
+            raise ValueError('Compressed binary MOC files can not be written')
+
+        with open(filename, 'wb') as f:
+            _write_binary(moc, f, encoding, checksum)
+
+
+def read_moc_binary(moc, filename, verify=False):
+    """Read a file in the native binary format into a MOC.
+
+    The contents of the file are added to the given MOC.  To use the
+    memory-mapped data directly, see `open_moc_binary`.
+    """
+
+    moc += open_moc_binary(filename, verify)
+
+
+def open_moc_binary(filename, verify=False):
+    """Open a file in the native binary format as a new MOC.
+
+    The file is memory mapped.  If it uses the RANGE encoding, the
+    returned MOC refers directly to the mapped data, so it can be
+    used without the data being read in full or copied.  (If the MOC
+    is modified, new arrays are constructed.)  If `verify` is
+    specified, the checksum is checked, which requires that all of the
+    data be read.
+
+    Instead of a file name, a bytes-like object can be given, in which
+    case the MOC refers directly to its data, or a binary file object,
+    from which the data are read.  Compressed files and file objects
+    are read in full, after decompression, rather than being mapped.
+    """
+
+    if isinstance(filename, (bytes, bytearray, memoryview)):
+        description = 'data'
+        (encoding, flags, count, crc) = _parse_header(
+            bytes(filename[:_header.size]), description)
+        values = np.frombuffer(filename, dtype=_value_type, count=count,
+                               offset=_header.size)
+
+    elif is_file_object(filename) or compression_from_contents(filename):
+        description = ('file object' if is_file_object(filename)
+                       else filename)
+        f = open_file(filename, 'rb')
+
+        try:
+            (encoding, flags, count, crc) = _parse_header(
+                f.read(_header.size), description)
+            data = f.read(count * _value_type.itemsize)
+
+        finally:
+            if f is not filename:
+                f.close()
+
+        if len(data) < count * _value_type.itemsize:
+            raise ValueError('MOC {0} is truncated'.format(description))
+
+        values = np.frombuffer(data, dtype=_value_type)
+
+    else:
+        description = filename
+        with open(filename, 'rb') as f:
+            (encoding, flags, count, crc) = _parse_header(
+                f.read(_header.size), description)
+
+        if count:
+            values = np.memmap(filename, dtype=_value_type, mode='r',
+                               offset=_header.size, shape=(count,))
+            values = values.view(np.ndarray)
+        else:
+            values = np.zeros(0, dtype=_value_type)
+
+    if verify:
+        if not flags & _flag_checksum:
+            raise ValueError('MOC {0} has no checksum'.format(description))
+
+        if crc32(values.data) & 0xffffffff != crc:
+            raise ValueError('MOC {0} checksum mismatch'.format(description))
+
+    if encoding == 'NUNIQ':
+        return MOC.from_uniq(values)
+
+    if count < MAX_ORDER + 2:
+        raise ValueError('MOC {0} is truncated'.format(description))
+
+    offsets = 2 * values[:MAX_ORDER + 2] + (MAX_ORDER + 2)
+
+    if (offsets[0] != MAX_ORDER + 2 or offsets[-1] != count or
+            np.any(offsets[1:] < offsets[:-1])):
+        raise ValueError('MOC {0} has invalid offsets'.format(description))
+
+    moc = MOC()
+    moc._set_orders(
+        [values[offsets[order]:offsets[order + 1]].reshape((-1, 2))
+         for order in range(0, MAX_ORDER + 1)],
+        normalized=bool(flags & _flag_normalized))
+
+    return moc
+
+
+def _write_binary(moc, f, encoding, checksum):
+    flags = 0
+    if moc.normalized:
+        flags |= _flag_normalized
+
+    # Write a provisional header, to be replaced once the
+    # checksum has been computed.
+    start = f.tell()
+    f.write(_header.pack(_magic, _version, 0, 0, 0, 0))
+
+    if encoding == 'RANGE':
+        chunks = _range_chunks(moc)
+    else:
+        chunks = moc.iter_uniq(write_chunk_size)
+
+    count = 0
+    crc = 0
+
+    for chunk in chunks:
+        data = chunk.astype(_value_type).tobytes()
+        f.write(data)
+
+        count += chunk.size
+        if checksum:
+            crc = crc32(data, crc)
+
+    if checksum:
+        flags |= _flag_checksum
+
+    end = f.tell()
+    f.seek(start)
+    f.write(_header.pack(
+        _magic, _version, ENCODINGS.index(encoding), flags,
+        count, crc & 0xffffffff))
+    f.seek(end)
+
+
+def _parse_header(header, description):
+    """Parse and check the header of a binary MOC file.
+
+    Returns a tuple of the encoding, flags, number of values
+    and checksum.
+    """
+
+    if len(header) < _header.size:
+        raise ValueError('MOC {0} is truncated'.format(description))
+
+    (magic, version, encoding, flags, count, crc) = _header.unpack(header)
+
+    if magic != _magic:
+        raise ValueError('{0} is not a binary MOC file'.format(description))
+
+    if version != _version or encoding >= len(ENCODINGS):
+        raise ValueError('MOC {0} uses an unsupported version'.format(
+            description))
+
+    return (ENCODINGS[encoding], flags, count, crc)
+
+
+def _range_chunks(moc):
+    """Generate the arrays making up the RANGE encoding of a MOC."""
+
+    ranges = [
+        moc.get_ranges(order) << (2 * (MAX_ORDER - order))
+        for order in range(0, MAX_ORDER + 1)]
+
+    yield np.cumsum([0] + [len(x) for x in ranges])
+
+    for ranges_i in ranges:
+        yield ranges_i.ravel()
+
+
+def _validate_encoding(encoding):
+    """Check that a binary MOC encoding is one which is supported."""
+
+    encoding = encoding.upper()
+
+    if encoding not in ENCODINGS:
+        raise ValueError('MOC encoding must be one of ' +
+                         ', '.join(ENCODINGS))
+
+    return encoding
@@ -0,0 +1,154 @@
+# Copyright (C) 2026 East Asian Observatory.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""On-disk cache of parsed MOC files.
+
+When a cache directory is given to :meth:`pymoc.MOC.read`, the MOC read
+from a file is stored in the directory in the native binary format
+(see :mod:`pymoc.io.binary`).  Subsequent reads of the same file, if it
+has not changed, then memory map the cached copy instead of parsing
+the file again.
+
+Cache entries are identified by the absolute path, size and modification
+time of the file, the file type and reading options, and the version
+of this package.  When the total size of the entries exceeds
+`max_size` bytes, the least recently used entries are removed.
+"""
+
+from __future__ import absolute_import
+
+from hashlib import sha256
+import os
+from tempfile import mkstemp
+
+from ..version import version
+from .binary import open_moc_binary, write_moc_binary
+
+# Maximum total size (in bytes) of the files in a cache directory.
+max_size = 1024 ** 3
+
+_extension = '.bmoc'
+
+
+def cache_key(filename, filetype, **kwargs):
+    """Determine the cache key for a MOC file.
+
+    The key changes if the file is modified (or replaced) or if a
+    different version of this package, file type or set of
+    reading options is used.
+    """
+
+    info = os.stat(filename)
+
+    identity = repr((
+        os.path.abspath(filename), info.st_size, info.st_mtime_ns,
+        filetype, sorted(kwargs.items()), version))
+
+    return sha256(identity.encode('utf-8')).hexdigest()
+
+
+def read_moc_cache(moc, directory, key):
+    """Read a MOC from the cache into the given MOC.
+
+    Returns True if the cache contained an entry for the given key,
+    or False otherwise.  The entry is marked as having been used
+    recently.
+    """
+
+    filename = os.path.join(directory, key + _extension)
+
+    try:
+        cached = open_moc_binary(filename)
+
+    except (OSError, ValueError):
+        return False
+
+    try:
+        os.utime(filename, None)
+    except OSError:
+        pass
+
+    moc += cached
+
+    return True
+
+
+def write_moc_cache(moc, directory, key):
+    """Write a MOC to the cache.
+
+    The entry is written to a temporary file which is then renamed,
+    so that other processes using the cache do not see partial entries.
+    Old entries are then removed to keep the cache within `max_size`.
+    """
+
+    os.makedirs(directory, exist_ok=True)
+
+    (fd, tmpname) = mkstemp(suffix='.tmp', dir=directory)
+
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            write_moc_binary(moc, f)
+
+        os.replace(tmpname, os.path.join(directory, key + _extension))
+
+    except Exception:
+        try:
+            os.unlink(tmpname)
+        except OSError:
+            pass
+
+        raise
+
+    prune_cache(directory)
+
+
+def prune_cache(directory, size=None):
+    """Remove the least recently used entries from a cache directory.
+
+    Entries are removed until their total size is no more than the
+    given size, or `max_size` if not specified.
+    """
+
+    if size is None:
+        size = max_size
+
+    entries = []
+
+    for name in os.listdir(directory):
+        if not name.endswith(_extension):
+            continue
+
+        filename = os.path.join(directory, name)
+
+        try:
+            info = os.stat(filename)
+        except OSError:
+            continue
+
+        entries.append((info.st_mtime, info.st_size, filename))
+
+    entries.sort()
+    total = sum(x[1] for x in entries)
+
+    for (mtime, entry_size, filename) in entries:
+        if total <= size:
+            break
+
+        try:
+            os.unlink(filename)
+        except OSError:
+            continue
+
+        total -= entry_size
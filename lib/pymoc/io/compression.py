@@ -0,0 +1,167 @@
+# Copyright (C) 2026 East Asian Observatory.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Handling of compressed MOC files.
+
+Files compressed with gzip, bzip2 or xz are recognized by their
+file name extension (".gz", ".bz2" or ".xz") when being written,
+and by their initial "magic" bytes when being read.  They are
+decompressed as they are read, so that the incremental parsers
+can process them without a temporary file.
+
+This module also contains functions to help handle file objects
+and in-memory (bytes) data in place of file names.
+"""
+
+from __future__ import absolute_import
+
+from io import BytesIO
+
+# Compression methods and their file name extensions and magic bytes.
+COMPRESSION = (
+    ('gzip', '.gz', b'\x1f\x8b'),
+    ('bz2', '.bz2', b'BZh'),
+    ('xz', '.xz', b'\xfd7zXZ\x00'),
+)
+
+
+def open_file(filename, mode='r'):
+    """Open a file, which may be compressed.
+
+    For reading, the compression method is determined from the contents
+    of the file, otherwise it is determined from the file name.
+    The mode can include "t" or "b" as for the built-in
+    `open` function.
+
+    For reading, an open binary file object can be given instead of
+    a file name.  If it is compressed, a file object which
+    decompresses it is returned, otherwise it is returned unchanged.
+    In this case the mode must be binary.
+    """
+
+    if is_file_object(filename):
+        if 'r' not in mode or 'b' not in mode:
+            raise ValueError('File objects can only be opened for reading '
+                             'in binary mode')
+
+        compression = compression_from_contents(filename)
+
+        if compression is None:
+            return filename
+
+    elif 'r' in mode:
+        compression = compression_from_contents(filename)
+
+    else:
+        (filename_base, compression) = compression_from_name(filename)
+
+    if compression is None:
+        return open(filename, mode)
+
+    # Compressed files default to binary mode, so specify text mode
+    # explicitly unless binary mode was requested.
+    if 'b' not in mode and 't' not in mode:
+        mode += 't'
+
+    if compression == 'gzip':
+        import gzip
+        return gzip.open(filename, mode)
+
+    elif compression == 'bz2':
+        import bz2
+        return bz2.open(filename, mode)
+
+    elif compression == 'xz':
+        import lzma
+        return lzma.open(filename, mode)
+
+    raise ValueError('Unknown compression method {0}'.format(compression))
+
+
+def compression_from_name(filename):
+    """Determine the compression method from a file name.
+
+    Returns a tuple of the file name without any compression extension
+    and the compression method, or None if the name does not have
+    a compression extension.
+    """
+
+    if is_file_object(filename):
+        return (filename, None)
+
+    namelc = filename.lower()
+
+    for (compression, extension, magic) in COMPRESSION:
+        if namelc.endswith(extension):
+            return (filename[:-len(extension)], compression)
+
+    return (filename, None)
+
+
+def compression_from_contents(filename):
+    """Determine the compression method of a file from its contents.
+
+    Returns the compression method, or None if the file does not
+    appear to be compressed.  A binary file object can be given
+    instead of a file name.
+    """
+
+    if is_file_object(filename):
+        start = peek_file_object(filename, 8)
+    else:
+        with open(filename, 'rb') as f:
+            start = f.read(8)
+
+    for (compression, extension, magic) in COMPRESSION:
+        if start.startswith(magic):
+            return compression
+
+    return None
+
+
+def is_file_object(obj):
+    """Determine whether an object is a file object rather than a name."""
+
+    return hasattr(obj, 'read') or hasattr(obj, 'write')
+
+
+def as_file_object(obj):
+    """Convert in-memory data to a file object.
+
+    If the given object is a bytes-like object, returns a binary file
+    object from which the data can be read.  Otherwise the object,
+    expected to be a file name or file object, is returned unchanged.
+    """
+
+    if isinstance(obj, (bytes, bytearray, memoryview)):
+        return BytesIO(obj)
+
+    return obj
+
+
+def peek_file_object(f, size):
+    """Read up to the given number of bytes from the current position
+    of a file object, without changing its position.
+
+    The file object must be seekable.
+    """
+
+    position = f.tell()
+
+    try:
+        return f.read(size)
+
+    finally:
+        f.seek(position)
@@ -1,5 +1,5 @@
 # Copyright (C) 2013-2014 Science and Technology Facilities Council.
-# Copyright (C) 2017 East Asian Observatory.
+# Copyright (C) 2017-2026 East Asian Observatory.
 #
 # This program is free software: you can redistribute it and/or modify
 # it under the terms of the GNU General Public License as published by
@@ -16,152 +16,420 @@
 
 from __future__ import absolute_import
 
-# If running under Python 2, import the itertools.izip function.  In
-# Python 3 this is not necessary -- the import will fail and we use the
-# normal zip function instead.
-try:
-    from itertools import izip
-except ImportError as e:
-    izip = zip
-
 from astropy.io import fits
+from contextlib import contextmanager
 from datetime import datetime
-from math import log
 import numpy as np
+import os
 
+from ..moc import MOC
+from .compression import as_file_object, compression_from_name, \
+    is_file_object, open_file
 from ..version import version
 
+ORDERINGS = ('NUNIQ', 'RANGE')
+
 
-def write_moc_fits_hdu(moc):
+def write_moc_fits_hdu(moc, ordering='NUNIQ'):
     """Create a FITS table HDU representation of a MOC.
+
+    The `ordering` can be "NUNIQ" (the default), to write the MOC
+    as a list of cells, or "RANGE" to use the MOC 2.0 range encoding,
+    in which each range of order 29 cells is stored as a pair of rows
+    giving its start and (exclusive) end.
     """
 
+    ordering = _validate_ordering(ordering)
+
     # Ensure data are normalized.
     moc.normalize()
 
-    # Determine whether a 32 or 64 bit column is required.
-    if moc.order < 14:
-        moc_type = np.int32
-        col_type = 'J'
+    if ordering == 'RANGE':
+        col = fits.Column(name='RANGE', format='K',
+                          array=moc.to_ranges().ravel())
+
     else:
-        moc_type = np.int64
-        col_type = 'K'
-
-    # Convert to the NUNIQ value which guarantees that one of the
-    # top two bits is set so that the order of the value can be
-    # determined.
-    nuniq = []
-    for (order, cells) in moc:
-        uniq_prefix = 4 * (4 ** order)
-        for npix in cells:
-            nuniq.append(npix + uniq_prefix)
-
-    # Prepare the data, and sort into numerical order.
-    nuniq = np.array(nuniq, dtype=moc_type)
-    nuniq.sort()
+        (moc_type, col_type) = _uniq_column_type(moc)
+
+        # Convert to the NUNIQ value which guarantees that one of the
+        # top two bits is set so that the order of the value can be
+        # determined.
+        nuniq = moc.to_uniq().astype(moc_type, copy=False)
+
+        col = fits.Column(name='UNIQ', format=col_type, array=nuniq)
 
     # Create the FITS file.
-    col = fits.Column(name='UNIQ', format=col_type, array=nuniq)
 
     cols = fits.ColDefs([col])
     rec = fits.FITS_rec.from_columns(cols)
     tbhdu = fits.BinTableHDU(rec)
 
-    # Mandatory Keywords.
-    tbhdu.header['PIXTYPE'] = 'HEALPIX'
-    tbhdu.header['ORDERING'] = 'NUNIQ'
-    tbhdu.header['COORDSYS'] = 'C'
-    tbhdu.header['MOCORDER'] = moc.order
-    tbhdu.header.comments['PIXTYPE'] = 'HEALPix magic code'
-    tbhdu.header.comments['ORDERING'] = 'NUNIQ coding method'
-    tbhdu.header.comments['COORDSYS'] = 'ICRS reference frame'
-    tbhdu.header.comments['MOCORDER'] = 'MOC resolution (best order)'
-
-    # Optional Keywords.
-    tbhdu.header['MOCTOOL'] = 'PyMOC ' + version
-    tbhdu.header.comments['MOCTOOL'] = 'Name of MOC generator'
-    if moc.type is not None:
-        tbhdu.header['MOCTYPE'] = moc.type
-        tbhdu.header.comments['MOCTYPE'] = 'Source type (IMAGE or CATALOG)'
-    if moc.id is not None:
-        tbhdu.header['MOCID'] = moc.id
-        tbhdu.header.comments['MOCID'] = 'Identifier of the collection'
-    if moc.origin is not None:
-        tbhdu.header['ORIGIN'] = moc.origin
-        tbhdu.header.comments['ORIGIN'] = 'MOC origin'
-    tbhdu.header['DATE'] = datetime.utcnow().replace(
-        microsecond=0).isoformat()
-    tbhdu.header.comments['DATE'] = 'MOC creation date'
-    if moc.name is not None:
-        tbhdu.header['EXTNAME'] = moc.name
-        tbhdu.header.comments['EXTNAME'] = 'MOC name'
+    _write_moc_fits_header(tbhdu.header, moc, ordering)
 
     return tbhdu
 
 
-def write_moc_fits(moc, filename, **kwargs):
+def write_moc_fits(moc, filename, ordering='NUNIQ', chunk_size=None,
+                   **kwargs):
     """Write a MOC as a FITS file.
 
+    The `ordering` can be "NUNIQ" or "RANGE" -- see `write_moc_fits_hdu`.
+
+    If a `chunk_size` is given, the table is streamed to the file in
+    chunks of this number of rows, rather than being constructed in
+    memory first.  In this case the only additional keyword argument
+    accepted is `overwrite`, and the file can not be compressed
+    or given as a file object.
+
+    Otherwise any additional keyword arguments are passed to the
+    astropy.io.fits.HDUList.writeto method.  If the filename ends
+    with ".gz", ".bz2" or ".xz", Astropy will compress the file.
+    """
+
+    if chunk_size is not None:
+        _write_moc_fits_streaming(
+            moc, filename, ordering, chunk_size, **kwargs)
+        return
+
+    write_moc_fits_multi([moc], filename, ordering, **kwargs)
+
+
+def write_moc_fits_multi(mocs, filename, ordering='NUNIQ', **kwargs):
+    """Write a sequence of MOCs as a FITS file.
+
+    Each MOC is written as a separate table extension.  Giving each MOC
+    a name (which is written as the EXTNAME) or an identifier (MOCID)
+    allows them to be selected when the file is read.
+    A binary file object can be given instead of a file name.
+
     Any additional keyword arguments are passed to the
     astropy.io.fits.HDUList.writeto method.
     """
 
-    tbhdu = write_moc_fits_hdu(moc)
     prihdr = fits.Header()
     prihdu = fits.PrimaryHDU(header=prihdr)
-    hdulist = fits.HDUList([prihdu, tbhdu])
+    hdulist = fits.HDUList(
+        [prihdu] + [write_moc_fits_hdu(moc, ordering) for moc in mocs])
     hdulist.writeto(filename, **kwargs)
 
 
-def read_moc_fits(moc, filename, include_meta=False, **kwargs):
+def read_moc_fits(moc, filename, include_meta=False, chunk_size=None,
+                  extname=None, mocid=None, **kwargs):
     """Read data from a FITS file into a MOC.
 
+    The file is opened using memory mapping (unless disabled by
+    giving `memmap=False`), so if a `chunk_size` is specified,
+    only that many rows of the table are read into memory at a time.
+    See `read_moc_fits_hdu` for details.
+
+    By default the first extension of the file is read.  If the file
+    contains multiple MOCs, one can be selected by its `extname`
+    or `mocid`.  Only the headers of the preceding extensions
+    are read.
+
+    Instead of a file name, a file object or a bytes-like object
+    containing the file can be given.
+
     Any additional keyword arguments are passed to the
     astropy.io.fits.open method.
     """
 
-    hl = fits.open(filename, mode='readonly', **kwargs)
+    with _open_fits(filename, **kwargs) as hl:
+        read_moc_fits_hdu(moc, _find_moc_fits_hdu(hl, extname, mocid),
+                          include_meta, chunk_size=chunk_size)
+
 
-    read_moc_fits_hdu(moc, hl[1], include_meta)
+def read_moc_fits_multi(filename, extnames=None, mocids=None,
+                        chunk_size=None, **kwargs):
+    """Read the MOCs from a FITS file containing multiple MOCs.
 
+    Returns a list of new MOC objects, including their metadata.
+    By default every extension is read.  If a collection of `extnames`
+    and/or `mocids` is given, only the extensions matching one of
+    the given values are read -- the data of the other extensions
+    are skipped.
 
-def read_moc_fits_hdu(moc, hdu, include_meta=False):
+    Any additional keyword arguments are passed to the
+    astropy.io.fits.open method.
+    """
+
+    mocs = []
+
+    with _open_fits(filename, **kwargs) as hl:
+        for hdu in hl[1:]:
+            header = hdu.header
+
+            if extnames is not None or mocids is not None:
+                if not ((extnames is not None and
+                         header.get('EXTNAME') in extnames) or
+                        (mocids is not None and
+                         header.get('MOCID') in mocids)):
+                    continue
+
+            moc = MOC()
+            read_moc_fits_hdu(moc, hdu, include_meta=True,
+                              chunk_size=chunk_size)
+            mocs.append(moc)
+
+    return mocs
+
+
+def read_moc_fits_header(moc, filename, extname=None, mocid=None,
+                         **kwargs):
+    """Read the metadata from the header of a FITS file into a MOC.
+
+    The table data are not read.  Returns a dictionary which
+    may contain the "order" and number of "cells" of the MOC,
+    where these can be determined from the header.  This is only
+    the case for files written by PyMOC, since other software may
+    record a different order, or store overlapping cells.
+    The extension can be selected as for `read_moc_fits`.
+
+    Any additional keyword arguments are passed to the
+    astropy.io.fits.open method.
+    """
+
+    with _open_fits(filename, **kwargs) as hl:
+        header = _find_moc_fits_hdu(hl, extname, mocid).header
+
+        _read_moc_fits_meta(moc, header)
+
+        values = {}
+
+        if not header.get('MOCTOOL', '').startswith('PyMOC'):
+            return values
+
+        if 'MOCORDER' in header:
+            values['order'] = int(header['MOCORDER'])
+        elif 'MOCORD_S' in header:
+            values['order'] = int(header['MOCORD_S'])
+
+        if header.get('ORDERING', 'NUNIQ').upper() == 'NUNIQ':
+            values['cells'] = int(header['NAXIS2'])
+
+    return values
+
+
+def read_moc_fits_hdu(moc, hdu, include_meta=False, chunk_size=None):
     """Read data from a FITS table HDU into a MOC.
+
+    The table may use either NUNIQ or RANGE ordering, as indicated by
+    the ORDERING header keyword.
+
+    If a `chunk_size` is given, the table is processed in chunks
+    of this number of rows.  Each chunk is converted to ranges of cells
+    before the next is read, so that the memory required depends
+    on the chunk size and the size of the resulting MOC,
+    rather than on the number of rows in the table.
     """
 
     if include_meta:
+        _read_moc_fits_meta(moc, hdu.header)
+
+    ordering = _validate_ordering(hdu.header.get('ORDERING', 'NUNIQ'))
+
+    values = hdu.data.field(0)
+
+    if ordering == 'RANGE':
+        if len(values) % 2:
+            raise ValueError('RANGE table has an odd number of rows')
+
+        values = values.reshape((-1, 2))
+        convert = MOC.from_ranges
+
+        # Convert the chunk size to a number of ranges.
+        if chunk_size is not None:
+            chunk_size = max(1, chunk_size // 2)
+
+    else:
+        convert = MOC.from_uniq
+
+    if chunk_size is None:
+        moc += convert(values)
+
+    else:
+        for start in range(0, len(values), chunk_size):
+            moc += convert(values[start:start + chunk_size])
+
+
+def _write_moc_fits_streaming(moc, filename, ordering, chunk_size,
+                              overwrite=False):
+    """Stream a MOC to a FITS file in chunks.
+
+    The header is written first, with the number of rows determined
+    from the number of cells (or ranges) in the normalized MOC.
+    The values are then generated in sorted order and written one
+    chunk at a time.
+    """
+
+    ordering = _validate_ordering(ordering)
+
+    if is_file_object(filename):
+        raise ValueError('FITS files can only be written in chunks '
+                         'given a file name')
+
+    if compression_from_name(filename)[1] is not None:
+        raise ValueError('Compressed FITS files can not be written in chunks')
+
+    moc.normalize()
+
+    if ordering == 'RANGE':
+        (moc_type, col_type, col_name) = (np.int64, 'K', 'RANGE')
+        values = moc.to_ranges().ravel()
+        n_rows = values.size
+        chunks = (values[i:i + chunk_size]
+                  for i in range(0, n_rows, chunk_size))
+
+    else:
+        (moc_type, col_type) = _uniq_column_type(moc)
+        col_name = 'UNIQ'
+        n_rows = moc.cells
+        chunks = moc.iter_uniq(chunk_size)
+
+    if os.path.exists(filename):
+        if not overwrite:
+            raise IOError('File {0} already exists'.format(filename))
+
+        os.remove(filename)
+
+    # Prepare the header of an empty table and then set the number of
+    # rows which we are going to write.
+    col = fits.Column(name=col_name, format=col_type)
+    tbhdu = fits.BinTableHDU.from_columns([col], nrows=0)
+    _write_moc_fits_header(tbhdu.header, moc, ordering)
+    tbhdu.header['NAXIS2'] = n_rows
+
+    # The streaming HDU expects data of the header's BITPIX type (8)
+    # so write the big-endian column values as bytes.
+    big_endian_type = np.dtype(moc_type).newbyteorder('>')
+
+    with fits.StreamingHDU(filename, tbhdu.header) as shdu:
+        for chunk in chunks:
+            shdu.write(chunk.astype(big_endian_type).view(np.uint8))
+
+
+@contextmanager
+def _open_fits(filename, **kwargs):
+    """Context manager to open a FITS file for reading.
+
+    File objects, and bytes-like objects, are decompressed if necessary
+    before being given to astropy.  A file object given by the caller
+    is not closed on exit, but the HDU list and any decompressing
+    file object opened here are.
+    """
+
+    filename = as_file_object(filename)
+    close = True
+
+    if is_file_object(filename):
+        fileobj = open_file(filename, 'rb')
+        close = fileobj is not filename
+        filename = fileobj
+
+    hl = fits.open(filename, mode='readonly', **kwargs)
+
+    try:
+        yield hl
+
+    finally:
+        hl.close(closed=close)
+
+
+def _find_moc_fits_hdu(hl, extname=None, mocid=None):
+    """Find the HDU containing a MOC in a FITS HDU list.
+
+    Returns the first extension, or the first extension matching
+    the given EXTNAME and/or MOCID.
+    """
+
+    if extname is None and mocid is None:
+        return hl[1]
+
+    for hdu in hl[1:]:
         header = hdu.header
 
-        if 'MOCTYPE' in header:
-            moc.type = header['MOCTYPE']
-        if 'MOCID' in header:
-            moc.id = header['MOCID']
-        if 'ORIGIN' in header:
-            moc.origin = header['ORIGIN']
-        if 'EXTNAME' in header:
-            moc.name = header['EXTNAME']
+        if ((extname is None or header.get('EXTNAME') == extname) and
+                (mocid is None or header.get('MOCID') == mocid)):
+            return hdu
+
+    raise KeyError('MOC extension not found in FITS file')
 
-    current_order = None
-    current_cells = []
 
-    # Determine type to use for orders: 32 bit if column type is J,
-    # otherwise assume we need 64 bit.
-    moc_type = np.int32 if (hdu.data.formats[0] == 'J') else np.int64
+def _read_moc_fits_meta(moc, header):
+    """Read the MOC metadata from a FITS table header."""
 
-    nuniqs = hdu.data.field(0)
-    orders = (np.log2(nuniqs / 4) / 2).astype(moc_type)
-    cells = nuniqs - 4 * (4 ** orders)
+    if 'MOCTYPE' in header:
+        moc.type = header['MOCTYPE']
+    if 'MOCID' in header:
+        moc.id = header['MOCID']
+    if 'ORIGIN' in header:
+        moc.origin = header['ORIGIN']
+    if 'EXTNAME' in header:
+        moc.name = header['EXTNAME']
 
-    for (order, cell) in izip(orders, cells):
-        if order != current_order:
-            if current_cells:
-                moc.add(current_order, current_cells)
 
-            current_order = order
-            current_cells = [cell]
+def _uniq_column_type(moc):
+    """Determine whether a 32 or 64 bit column is required.
+
+    Returns a tuple containing the NumPy type and FITS column format.
+    """
+
+    if moc.order < 14:
+        return (np.int32, 'J')
+    else:
+        return (np.int64, 'K')
 
-        else:
-            current_cells.append(cell)
 
-    if current_cells:
-        moc.add(current_order, current_cells)
+def _validate_ordering(ordering):
+    """Check that a FITS MOC ordering is one which is supported."""
+
+    ordering = ordering.upper()
+
+    if ordering not in ORDERINGS:
+        raise ValueError('MOC ordering must be one of ' +
+                         ', '.join(ORDERINGS))
+
+    return ordering
+
+
+def _write_moc_fits_header(header, moc, ordering='NUNIQ'):
+    """Add the MOC keywords to a FITS table header."""
+
+    # Mandatory Keywords.
+    header['PIXTYPE'] = 'HEALPIX'
+    header['ORDERING'] = ordering
+    header['COORDSYS'] = 'C'
+    header['MOCORDER'] = moc.order
+    header.comments['PIXTYPE'] = 'HEALPix magic code'
+    header.comments['ORDERING'] = ordering + ' coding method'
+    header.comments['COORDSYS'] = 'ICRS reference frame'
+    header.comments['MOCORDER'] = 'MOC resolution (best order)'
+
+    # The range encoding was introduced in MOC 2.0, which also
+    # specifies the dimension and names the order keyword differently.
+    if ordering == 'RANGE':
+        header['MOCVERS'] = '2.0'
+        header['MOCDIM'] = 'SPACE'
+        header['MOCORD_S'] = moc.order
+        header.comments['MOCVERS'] = 'MOC version'
+        header.comments['MOCDIM'] = 'Physical dimension'
+        header.comments['MOCORD_S'] = 'MOC resolution (best order)'
+
+    # Optional Keywords.
+    header['MOCTOOL'] = 'PyMOC ' + version
+    header.comments['MOCTOOL'] = 'Name of MOC generator'
+    if moc.type is not None:
+        header['MOCTYPE'] = moc.type
+        header.comments['MOCTYPE'] = 'Source type (IMAGE or CATALOG)'
+    if moc.id is not None:
+        header['MOCID'] = moc.id
+        header.comments['MOCID'] = 'Identifier of the collection'
+    if moc.origin is not None:
+        header['ORIGIN'] = moc.origin
+        header.comments['ORIGIN'] = 'MOC origin'
+    header['DATE'] = datetime.utcnow().replace(
+        microsecond=0).isoformat()
+    header.comments['DATE'] = 'MOC creation date'
+    if moc.name is not None:
+        header['EXTNAME'] = moc.name
+        header.comments['EXTNAME'] = 'MOC name'
@@ -1,4 +1,5 @@
 # Copyright (C) 2014 Science and Technology Facilities Council.
+# Copyright (C) 2026 East Asian Observatory.
 #
 # This program is free software: you can redistribute it and/or modify
 # it under the terms of the GNU General Public License as published by
@@ -15,50 +16,186 @@
 
 from __future__ import absolute_import, unicode_literals
 
-from codecs import utf_8_decode, utf_8_encode
-import json
+from codecs import getincrementaldecoder, utf_8_encode
+import re
+
+from ..ranges import MAX_ORDER
+from .compression import open_file
+
+# Number of cells to format at a time when writing.
+write_chunk_size = 10000
+
+# Number of bytes to read from the file at a time.
+read_buffer_size = 65536
+
+# Number of cells to accumulate before adding them to the MOC.
+read_batch_size = 100000
+
+# Pattern matching the tokens of the JSON MOC layout:
+# punctuation, strings and numbers.
+_token_pattern = re.compile(r'[{}\[\]:,]|"[^"]*"|[^\s{}\[\]:,"]+')
+
+# Characters after which a chunk of text can be split without
+# breaking a token.
+_delimiters = '{}[]:,'
 
 
 def write_moc_json(moc, filename=None, file=None):
     """Write a MOC in JSON encoding.
 
     Either a filename, or an open file object can be specified.
+    If the filename ends with ".gz", ".bz2" or ".xz", the file
+    will be compressed.
+
+    The cells for each order are written to the file in chunks,
+    rather than first constructing the whole JSON document.
     """
 
     moc.normalize()
 
-    obj = {}
-
-    for (order, cells) in moc:
-        obj['{0}'.format(order)] = sorted(cells)
-
     if file is not None:
-        _write_json(obj, file)
+        _write_json(moc, file)
     else:
-        with open(filename, 'wb') as f:
-            _write_json(obj, f)
+        with open_file(filename, 'wb') as f:
+            _write_json(moc, f)
 
 
 def read_moc_json(moc, filename=None, file=None):
     """Read JSON encoded data into a MOC.
 
     Either a filename, or an open file object can be specified.
+    A file compressed with gzip, bzip2 or xz will be decompressed
+    as it is read.
+
+    The file is read in chunks and the cells for each order are added
+    to the MOC in batches, so the complete document is never held
+    in memory.  Only the ``{"order": [cells...], ...}`` layout of
+    a MOC is supported, not JSON in general.  Cell numbers may be
+    written in any JSON number format (e.g. ``1e2``) but must
+    be integers.
     """
 
     if file is not None:
-        obj = _read_json(file)
+        _read_json(moc, file)
     else:
-        with open(filename, 'rb') as f:
-            obj = _read_json(f)
+        with open_file(filename, 'rb') as f:
+            _read_json(moc, f)
+
+
+def _write_json(moc, f):
+    # Write the orders sorted by their keys, as json.dumps would
+    # with sort_keys enabled.
+    orders = sorted(
+        (order for order in range(0, MAX_ORDER + 1)
+         if moc.get_ranges(order).size),
+        key=lambda x: '{0}'.format(x))
+
+    separator = '{'
+
+    for order in orders:
+        f.write(utf_8_encode('{0}"{1}":['.format(separator, order))[0])
+        separator = ','
+
+        first = True
+        for cells in moc.iter_cells(order, write_chunk_size):
+            text = ','.join(map(str, cells.tolist()))
+
+            if not first:
+                text = ',' + text
+            first = False
+
+            f.write(utf_8_encode(text)[0])
+
+        f.write(b']')
+
+    f.write(b'{}' if separator == '{' else b'}')
+
+
+def _read_json(moc, f):
+    order = None
+    cells = None
+
+    for token in _read_json_tokens(f):
+        if token.startswith('"'):
+            if cells is not None:
+                raise ValueError('Unexpected string in JSON MOC cell list')
+            order = token[1:-1]
+
+        elif token == '[':
+            if order is None or cells is not None:
+                raise ValueError('Unexpected list in JSON MOC')
+            cells = []
+
+        elif token == ']':
+            if cells is None:
+                raise ValueError('Unexpected end of list in JSON MOC')
+            if cells:
+                moc.add(order, cells)
+            order = cells = None
+
+        elif token in _delimiters:
+            pass
+
+        elif cells is None:
+            raise ValueError('Unexpected value in JSON MOC')
+
+        else:
+            cells.append(_parse_cell(token))
+
+            if len(cells) >= read_batch_size:
+                moc.add(order, cells)
+                cells = []
+
+
+def _parse_cell(token):
+    """Parse a JSON number token as a cell number.
+
+    Numbers written in floating point notation are accepted if they
+    have integer values.
+    """
+
+    try:
+        return int(token)
+    except ValueError:
+        pass
+
+    try:
+        value = float(token)
+    except ValueError:
+        raise ValueError('Invalid value in JSON MOC: {0}'.format(token))
+
+    if not value.is_integer():
+        raise ValueError('Non-integer cell in JSON MOC: {0}'.format(token))
+
+    return int(value)
+
+
+def _read_json_tokens(f):
+    """Generate tokens from a JSON file.
+
+    The file is read and decoded in chunks.  Text following the last
+    delimiter in each chunk is kept to be combined with the next chunk,
+    in case it contains only part of a token.  If the file was opened
+    in text mode, it is not decoded.
+    """
+
+    decoder = getincrementaldecoder('utf-8')()
+    partial = ''
 
-    for (order, cells) in obj.items():
-        moc.add(order, cells)
+    while True:
+        data = f.read(read_buffer_size)
 
+        if isinstance(data, bytes):
+            text = partial + decoder.decode(data, final=(not data))
+        else:
+            text = partial + data
 
-def _write_json(obj, f):
-    f.write(utf_8_encode(
-        json.dumps(obj, sort_keys=True, separators=(',', ':')))[0])
+        if data:
+            split = max(text.rfind(x) for x in _delimiters) + 1
+            (text, partial) = (text[:split], text[split:])
 
+        for token in _token_pattern.findall(text):
+            yield token
 
-def _read_json(f):
-    return json.loads(utf_8_decode(f.read())[0])
+        if not data:
+            break
@@ -1,5 +1,5 @@
 # Copyright (C) 2013-2014 Science and Technology Facilities Council.
-# Copyright (C) 2015-2016 East Asian Observatory.
+# Copyright (C) 2015-2026 East Asian Observatory.
 #
 # This program is free software: you can redistribute it and/or modify
 # it under the terms of the GNU General Public License as published by
@@ -19,10 +19,22 @@ from __future__ import absolute_import
 from math import pi
 from os.path import isfile
 
-MAX_ORDER = 29
+import numpy as np
+
+from .io.compression import as_file_object, compression_from_name, \
+    is_file_object, open_file
+from .ranges import MAX_ORDER, \
+    cells_to_ranges, degrade_ranges, empty_ranges, merge_ranges, \
+    ranges_difference, ranges_intersection, ranges_length, \
+    ranges_to_cells, ranges_union, split_ranges
 
 MOC_TYPES = ('IMAGE', 'CATALOG')
 
+# Number of pending ranges which may be tested separately by
+# `MOC.contains_many`, rather than being merged into the main range
+# sets, if larger than the square root of the number of main ranges.
+_max_pending_ranges = 1024
+
 
 class MOC(object):
     """Class representing Multi-Order Coverage maps.
@@ -33,6 +45,10 @@ class MOC(object):
     * id
     * name
     * origin
+
+    The cells at each order are stored as a range set
+    (see :mod:`pymoc.ranges`), i.e. as sorted intervals of
+    order 29 cell numbers in a NumPy array.
     """
 
     def __init__(self, order=None, cells=None,
@@ -71,9 +87,16 @@ class MOC(object):
         'IMAGE'
         """
 
-        self._orders = tuple(set() for i in range(0, MAX_ORDER + 1))
+        self._orders = [empty_ranges() for i in range(0, MAX_ORDER + 1)]
+        self._pending = tuple([] for i in range(0, MAX_ORDER + 1))
+        self._coverage = {}
         self._normalized = True
 
+        # Function to read the cells of a lazily opened MOC, and values
+        # from its header which can be used until the cells are read.
+        self._loader = None
+        self._header_values = {}
+
         # Initialize metadata properties but wait until after reading
         # metadata from a file before overriding with specified values.
         self.id = None
@@ -118,8 +141,8 @@ class MOC(object):
         """
 
         for order in range(0, MAX_ORDER + 1):
-            if self._orders[order]:
-                yield (order, frozenset(self._orders[order]))
+            if self._get_ranges(order).size:
+                yield (order, frozenset(self._get_cells(order).tolist()))
 
     def __len__(self):
         """Length operator for MOC objects.
@@ -134,7 +157,7 @@ class MOC(object):
         n = 0
 
         for order in range(0, MAX_ORDER + 1):
-            if self._orders[order]:
+            if self._get_ranges(order).size:
                 n += 1
 
         return n
@@ -152,7 +175,7 @@ class MOC(object):
 
         order = self._validate_order(order)
 
-        return frozenset(self._orders[order])
+        return frozenset(self._get_cells(order).tolist())
 
     def __eq__(self, other):
         """Equality test operator.
@@ -170,14 +193,9 @@ class MOC(object):
         if not isinstance(other, MOC):
             return NotImplemented
 
-        self.normalize()
-        other.normalize()
-
-        for order in range(0, MAX_ORDER + 1):
-            if self._orders[order] != other._orders[order]:
-                return False
-
-        return True
+        # The merged range sets are equal exactly when the normalized
+        # MOCs would be equal.
+        return np.array_equal(self._get_coverage(), other._get_coverage())
 
     def __ne__(self, other):
         """Inequality test operator.
@@ -201,8 +219,8 @@ class MOC(object):
         if not isinstance(other, MOC):
             return NotImplemented
 
-        for (order, cells) in other:
-            self.add(order, cells)
+        for order in range(0, MAX_ORDER + 1):
+            self._add_ranges(order, other._get_ranges(order))
 
         return self
 
@@ -251,8 +269,7 @@ class MOC(object):
         if not isinstance(other, MOC):
             return NotImplemented
 
-        for (order, cells) in other:
-            self.remove(order, cells)
+        self._remove_ranges(other._get_coverage())
 
         return self
 
@@ -266,7 +283,8 @@ class MOC(object):
         """
 
         return '<MOC: {0!r}>'.format(
-            [(o, sorted(cs)) for (o, cs) in enumerate(self._orders) if cs])
+            [(o, self._get_cells(o).tolist())
+             for o in range(0, MAX_ORDER + 1) if self._get_ranges(o).size])
 
     @property
     def order(self):
@@ -275,10 +293,18 @@ class MOC(object):
         >>> m = MOC(4, (3, 2, 1))
         >>> m.order
         4
+
+        For a MOC opened with the `open` method, this may be determined
+        from the MOCORDER header keyword, without reading the cells,
+        if the file was written by PyMOC.
         """
 
+        header_order = self._get_header_value('order')
+        if header_order is not None:
+            return header_order
+
         for order in range(MAX_ORDER, 0, -1):
-            if self._orders[order]:
+            if self._get_ranges(order).size:
                 return order
 
         return 0
@@ -341,13 +367,8 @@ class MOC(object):
         3.14
         """
 
-        self.normalize()
-        area = 0.0
-
-        for (order, cells) in self:
-            area += (len(cells) * pi) / (3 * 4 ** order)
-
-        return area
+        return (ranges_length(self._get_coverage()) * pi) / (
+            3 * 4 ** MAX_ORDER)
 
     @property
     def area_sq_deg(self):
@@ -371,12 +392,21 @@ class MOC(object):
         >>> m = MOC(0, (1, 2))
         >>> m.cells
         2
+
+        For a MOC opened with the `open` method, this may be determined
+        from the number of rows of a NUNIQ table written by PyMOC,
+        without reading the cells.
         """
 
+        header_cells = self._get_header_value('cells')
+        if header_cells is not None:
+            return header_cells
+
         n = 0
 
-        for (order, cells) in self:
-            n += len(cells)
+        for order in range(0, MAX_ORDER + 1):
+            n += ranges_length(self._get_ranges(order)) >> (
+                2 * (MAX_ORDER - order))
 
         return n
 
@@ -406,31 +436,95 @@ class MOC(object):
         order = self._validate_order(order)
 
         if no_validation:
-            # Simply add the given cells to the set with no validation.
-            self._orders[order].update(cells)
+            # Simply convert the given cells to an array with no validation.
+            # Arrays are copied since they are stored until next merged.
+            if isinstance(cells, np.ndarray):
+                cells = np.array(cells, dtype=np.int64)
+            else:
+                cells = np.fromiter(cells, dtype=np.int64)
 
         else:
-            # Collect validated cell numbers in a set for addition.
-            cell_set = set()
+            cells = self._validate_cells(order, cells)
+
+        # Store the cells to be merged into the range set when next
+        # required, so that repeated calls to this method are efficient.
+        if cells.size:
+            self._pending[order].append(cells.ravel())
+
+    def add_ranges(self, order, ranges):
+        """Add ranges of cells at a given order to the MOC.
+
+        Each range is given as a pair of cell numbers ``(start, end)``,
+        where ``end`` is the number following the last cell in the range.
+        The cells are not expanded individually, so this is much more
+        efficient than the `add` method for long ranges of cells.
+
+        >>> m = MOC()
+        >>> m.add_ranges(4, [(20, 24), (30, 31)])
+        >>> m.cells
+        5
+        """
+
+        order = self._validate_order(order)
+
+        max_cells = self._order_num_cells(order)
+
+        try:
+            ranges = np.asarray(ranges, dtype=np.int64).reshape((-1, 2))
+        except (ValueError, TypeError) as e:
+            raise TypeError('MOC cell ranges must be pairs of integers')
+        except OverflowError as e:
+            ranges = None
+
+        if ranges is None or (ranges.size and not (
+                0 <= ranges[:, 0].min() and ranges[:, 1].max() <= max_cells)):
+            raise ValueError(
+                'MOC cell order {0} must be in range 0-{1}'.format(
+                    order, max_cells - 1))
+
+        # Pending range sets are merged when next required, so the
+        # ranges do not need to be sorted or disjoint here.
+        shift = 2 * (MAX_ORDER - order)
 
-            for cell in cells:
-                cell = self._validate_cell(order, cell)
-                cell_set.add(cell)
+        self._add_ranges(order, ranges[ranges[:, 0] < ranges[:, 1]] << shift)
 
-            self._orders[order].update(cell_set)
+    def get_ranges(self, order):
+        """Get the ranges of cells at a given order.
+
+        The ranges are returned as a NumPy int64 array of shape (n, 2)
+        of ``(start, end)`` pairs of cell numbers, where ``end`` is the
+        number following the last cell in the range, as accepted
+        by the `add_ranges` method.  The ranges are sorted and
+        separated by at least one cell which is not present.
+
+        >>> MOC(4, (20, 21, 22, 30)).get_ranges(4).tolist()
+        [[20, 23], [30, 31]]
+        """
+
+        order = self._validate_order(order)
+
+        return self._get_ranges(order) >> (2 * (MAX_ORDER - order))
 
     def remove(self, order, cells):
         """Remove cells at a given order from the MOC.
+
+        The cells can be given as any collection of integers,
+        including a NumPy array.  Any part of the MOC
+        which overlaps these cells is removed, with larger
+        cells being broken up as necessary.
+
+        >>> m = MOC(0, (0,))
+        >>> m.remove(2, (15,))
+        >>> m
+        <MOC: [(1, [0, 1, 2]), (2, [12, 13, 14])]>
         """
 
         self._normalized = False
 
         order = self._validate_order(order)
+        cells = self._validate_cells(order, cells)
 
-        for cell in cells:
-            cell = self._validate_cell(order, cell)
-
-            self._compare_operation(order, cell, True, 'remove')
+        self._remove_ranges(cells_to_ranges(order, cells))
 
     def clear(self):
         """Clears all cells from a MOC.
@@ -441,9 +535,13 @@ class MOC(object):
         0
         """
 
+        self._loader = None
+
         for order in range(0, MAX_ORDER + 1):
-            self._orders[order].clear()
+            self._orders[order] = empty_ranges()
+            del self._pending[order][:]
 
+        self._coverage.clear()
         self._normalized = True
 
     def copy(self):
@@ -489,73 +587,57 @@ class MOC(object):
         order = self._validate_order(order)
         cell = self._validate_cell(order, cell)
 
-        return self._compare_operation(order, cell, include_smaller, 'check')
-
-    def _compare_operation(self, order, cell, include_smaller, operation):
-        """General internal method for comparison-based operations.
-
-        This is a private method, and does not update the normalized
-        flag.
-        """
-
-        # Check for a larger cell (lower order) which contains the
-        # given cell.
-        for order_i in range(0, order):
-            shift = 2 * (order - order_i)
-            cell_i = cell >> shift
-
-            if cell_i in self._orders[order_i]:
-                if operation == 'check':
-                    return True
-                elif operation == 'remove':
-                    # Remove the cell and break it into its 4 constituent
-                    # cells.  Those which actually match the area we are
-                    # trying to remove will be removed at the next stage.
-                    self._orders[order_i].remove(cell_i)
-                    self.add(order_i + 1,
-                             range(cell_i << 2, (cell_i + 1) << 2))
-                elif operation == 'inter':
-                    return [(order, (cell,))]
-
-        # Check for the specific cell itself, but only after looking at larger
-        # cells because for the "remove" operation we may have broken up
-        # one of the large cells so that it subsequently matches.
-        if cell in self._orders[order]:
-            if operation == 'check':
-                return True
-            elif operation == 'remove':
-                self._orders[order].remove(cell)
-            elif operation == 'inter':
-                return [(order, (cell,))]
-
-        result = []
-
-        if include_smaller:
-            # Check for a smaller cell (higher order) which is part
-            # of the given cell.
-            for order_i in range(order + 1, MAX_ORDER + 1):
-                shift = 2 * (order_i - order)
-
-                cells = []
-
-                for cell_i in self._orders[order_i]:
-                    if (cell_i >> shift) == cell:
-                        if operation == 'check':
-                            return True
-                        elif operation == 'remove' or operation == 'inter':
-                            cells.append(cell_i)
-
-                if operation == 'remove':
-                    for cell_i in cells:
-                        self._orders[order_i].remove(cell_i)
-                elif operation == 'inter':
-                    if cells:
-                        result.append((order_i, cells))
-
-        if operation == 'check':
-            return False
-        elif operation == 'inter':
-            return result
+        return bool(self.contains_many(order, (cell,), include_smaller)[0])
+
+    def contains_many(self, order, cells, include_smaller=False):
+        """Test whether the MOC contains each of the given cells.
+
+        This is equivalent to the `contains` method, but takes a
+        collection of cells (such as a NumPy array) at the given order
+        and returns a NumPy boolean array of the same shape.
+
+        >>> m = MOC(1, (5,))
+        >>> m.contains_many(2, (19, 20, 21, 23, 24)).tolist()
+        [False, True, True, True, False]
+        >>> m.contains_many(0, (0, 1, 2), True).tolist()
+        [False, True, False]
+
+        The test is performed by searching a merged range set of the
+        MOC's cells, which is retained for subsequent queries until
+        the MOC is modified.  Cells added since then are searched
+        separately, while they are few, so that alternately adding
+        and testing cells does not require repeated merging.
+        """
+
+        order = self._validate_order(order)
+        cells = self._validate_cells(order, cells)
+
+        shift = 2 * (MAX_ORDER - order)
+        starts = cells << shift
+        ends = (cells + 1) << shift
+
+        result = np.zeros(cells.shape, dtype=np.bool_)
+
+        for coverage in self._get_coverage_parts(
+                MAX_ORDER if include_smaller else order):
+            if not coverage.size:
+                continue
+
+            # Determine whether the start of each cell is within the cells
+            # at the same or lower orders.  If so, the whole cell is.
+            # Positions which fall within a range are found after an odd
+            # number of range boundaries.
+            flat = coverage.ravel()
+            index = self._search_ranges(flat, starts)
+            result |= (index % 2) == 1
+
+            if include_smaller:
+                # Also check whether a range begins within the cell.
+                result |= np.logical_and(
+                    index < flat.size,
+                    np.take(flat, index, mode='clip') < ends)
+
+        return result
 
     def intersection(self, other):
         """Returns a MOC representing the intersection with another MOC.
@@ -564,14 +646,41 @@ class MOC(object):
         >>> q = MOC(2, (4, 5, 6))
         >>> p.intersection(q)
         <MOC: [(2, [4, 5])]>
+
+        Where cells of the two MOCs overlap, the smaller cell is included
+        in the result.  This is determined for each order by sweeping
+        through the range sets for that order and the combined range sets
+        for the lower orders.  The result is not normalized.
         """
 
         inter = MOC()
 
-        for (order, cells) in other:
-            for cell in cells:
-                for i in self._compare_operation(order, cell, True, 'inter'):
-                    inter.add(*i)
+        # Range sets representing the cells of each MOC at the
+        # orders considered so far.
+        self_lower = other_lower = empty_ranges()
+
+        for order in range(0, MAX_ORDER + 1):
+            self_ranges = self._get_ranges(order)
+            other_ranges = other._get_ranges(order)
+
+            # Include cells of the other MOC which lie within cells of
+            # this MOC at the same or lower orders.
+            if self_ranges.size:
+                self_lower = ranges_union(self_lower, self_ranges)
+
+            if other_ranges.size and self_lower.size:
+                inter._add_ranges(order, ranges_intersection(
+                    other_ranges, self_lower))
+
+            # Include cells of this MOC which lie within cells of the
+            # other MOC at lower orders only, since cells at the same
+            # order were included above.
+            if self_ranges.size and other_lower.size:
+                inter._add_ranges(order, ranges_intersection(
+                    self_ranges, other_lower))
+
+            if other_ranges.size:
+                other_lower = ranges_union(other_lower, other_ranges)
 
         return inter
 
@@ -604,55 +713,22 @@ class MOC(object):
         if self.normalized and max_order >= self.order:
             return
 
-        # Group the pixels by iterating down from the order.  At each
-        # order, where all 4 adjacent pixels are present (or we are above
-        # the maximum order) they are replaced with a single pixel in the
-        # next lower order.  Otherwise the pixel should appear in the MOC
-        # unless it is already represented at a lower order.
-        for order in range(self.order, 0, -1):
-            pixels = self._orders[order]
-
-            next_pixels = self._orders[order - 1]
-
-            new_pixels = set()
-
-            while pixels:
-                pixel = pixels.pop()
-
-                # Look to lower orders to ensure this pixel isn't
-                # already covered.
-                check_pixel = pixel
-                already_contained = True
-                for check_order in range(order - 1, -1, -1):
-                    check_pixel >>= 2
-                    if check_pixel in self._orders[check_order]:
-                        break
-                else:
-                    already_contained = False
-
-                # Check whether this order is above the maximum, or
-                # if we have all 4 adjacent pixels.  Also do this if
-                # the pixel was already contained at a lower level
-                # so that we can avoid checking the adjacent pixels.
-                if (already_contained or (order > max_order) or
-                        (((pixel ^ 1) in pixels) and
-                         ((pixel ^ 2) in pixels) and
-                         ((pixel ^ 3) in pixels))):
-
-                    pixels.discard(pixel ^ 1)
-                    pixels.discard(pixel ^ 2)
-                    pixels.discard(pixel ^ 3)
-
-                    if not already_contained:
-                        # Group these pixels by placing the equivalent pixel
-                        # for the next order down in the set.
-                        next_pixels.add(pixel >> 2)
-
-                else:
-                    new_pixels.add(pixel)
-
-            if new_pixels:
-                self._orders[order].update(new_pixels)
+        # Find the area covered by the cells at all orders, expanding it
+        # to whole cells at the maximum order if required.
+        ranges = self._get_coverage()
+
+        if max_order < MAX_ORDER:
+            ranges = degrade_ranges(ranges, max_order)
+
+        # Store the largest cells which make up this area.  Since the
+        # ranges are merged, this ensures that no area is covered more than
+        # once and that no group of 4 neighboring cells is present.
+        self._orders = [empty_ranges() for i in range(0, MAX_ORDER + 1)]
+
+        for (order, ranges_i) in split_ranges(ranges):
+            self._orders[order] = ranges_i
+
+        self._coverage.clear()
 
         self._normalized = True
 
@@ -664,30 +740,215 @@ class MOC(object):
         else:
             order = self._validate_order(order)
 
-        # Start with the cells which are already at this order.
-        flat = set(self[order])
+        # Cells at this order and at lower orders are already represented
+        # by ranges which lie on the boundaries of cells at this order.
+        ranges = [self._get_ranges(order_i) for order_i in range(0, order + 1)]
 
-        # Look at lower orders and expand them into this set.
-        # Based on the "map" algorithm from Appendix A of the
-        # MOC recommendation.
-        for order_i in range(0, order):
-            shift = 2 * (order - order_i)
+        # Look at higher orders unless we have been told to exclude
+        # them.  These are expanded to the boundaries of the cells
+        # at this order which contain them.
+        if include_smaller and order < MAX_ORDER:
+            ranges.append(degrade_ranges(np.concatenate([
+                self._get_ranges(order_i)
+                for order_i in range(order + 1, MAX_ORDER + 1)]), order))
+
+        return set(ranges_to_cells(
+            order, merge_ranges(np.concatenate(ranges))).tolist())
+
+    def to_uniq(self):
+        """Return the cells of the MOC as a NumPy array of NUNIQ values.
+
+        The NUNIQ value encodes the order and cell number in a single
+        integer.  The values are returned sorted in an int64 array.
+        The MOC is not normalized first, so if that is required, the
+        `normalize` method should be called beforehand.
+
+        >>> MOC(1, (5, 6)).to_uniq().tolist()
+        [21, 22]
+        """
 
-            for cell in self[order_i]:
-                flat.update(range(cell << shift, (cell + 1) << shift))
+        return np.concatenate(
+            [self._get_cells(order) + (4 << (2 * order))
+             for order in range(0, MAX_ORDER + 1)])
 
-        # Look at higher orders unless we have been told to exclude
-        # them.
-        if include_smaller:
-            for order_i in range(order + 1, MAX_ORDER + 1):
-                shift = 2 * (order_i - order)
+    def iter_uniq(self, chunk_size):
+        """Iterate over the cells of the MOC as arrays of NUNIQ values.
+
+        This gives the same values as `to_uniq`, in the same order,
+        but in int64 arrays of at most `chunk_size` values, so that
+        the complete array need not be constructed at once.
+
+        >>> [x.tolist() for x in MOC(1, (5, 6, 7)).iter_uniq(2)]
+        [[21, 22], [23]]
+        """
+
+        for order in range(0, MAX_ORDER + 1):
+            for cells in self.iter_cells(order, chunk_size):
+                yield cells + (4 << (2 * order))
+
+    def iter_cells(self, order, chunk_size):
+        """Iterate over the cells at a given order in chunks.
+
+        The cells are given in ascending order, in int64 arrays of at most
+        `chunk_size` values.  Only the ranges needed for each chunk are
+        expanded into individual cells.
+
+        >>> [x.tolist() for x in MOC(1, (5, 6, 7, 10)).iter_cells(1, 3)]
+        [[5, 6, 7], [10]]
+        """
+
+        order = self._validate_order(order)
+
+        if chunk_size < 1:
+            raise ValueError('Chunk size must be positive')
+
+        ranges = self._get_ranges(order)
+
+        if not ranges.size:
+            return
+
+        shift = 2 * (MAX_ORDER - order)
+        starts = ranges[:, 0] >> shift
+        ends = ranges[:, 1] >> shift
+
+        # Find the range containing the first cell of each chunk,
+        # using the number of cells preceding the end of each range.
+        totals = np.cumsum(ends - starts)
+
+        for first in range(0, int(totals[-1]), chunk_size):
+            last = min(first + chunk_size, int(totals[-1]))
+            (i, j) = np.searchsorted(totals, (first, last - 1), side='right')
+
+            chunk_starts = starts[i:j + 1].copy()
+            chunk_ends = ends[i:j + 1].copy()
+            chunk_starts[0] = ends[i] - (totals[i] - first)
+            chunk_ends[-1] = ends[j] - (totals[j] - last)
+
+            yield ranges_to_cells(order, np.column_stack((
+                chunk_starts << shift, chunk_ends << shift)))
+
+    @classmethod
+    def from_uniq(cls, uniq):
+        """Construct a new MOC from a collection of NUNIQ values.
+
+        The values can be given as a NumPy array, in any order.
+
+        >>> MOC.from_uniq([21, 22, 4])
+        <MOC: [(0, [0]), (1, [5, 6])]>
+        """
+
+        moc = cls()
+
+        uniq = np.asarray(uniq, dtype=np.int64).ravel()
+
+        if uniq.size > 1 and not np.all(uniq[1:] >= uniq[:-1]):
+            uniq = np.sort(uniq)
+
+        # The NUNIQ values for each order lie in the interval
+        # [4 * 4 ** order, 16 * 4 ** order) so once sorted, the values
+        # can be divided by order by searching for the interval boundaries.
+        # This uses integer arithmetic only, so is exact at all orders.
+        boundaries = np.searchsorted(
+            uniq, 4 << (2 * np.arange(0, MAX_ORDER + 2, dtype=np.int64)))
+
+        if boundaries[0] > 0 or boundaries[-1] < uniq.size:
+            raise ValueError('NUNIQ value out of range')
+
+        for order in range(0, MAX_ORDER + 1):
+            cells = uniq[boundaries[order]:boundaries[order + 1]]
+
+            if cells.size:
+                moc.add(order, cells - (4 << (2 * order)), no_validation=True)
+
+        return moc
+
+    def to_ranges(self):
+        """Return the area covered by the MOC as a range set.
+
+        The result is a NumPy int64 array of shape (n, 2) giving the
+        ``[start, end)`` intervals of order 29 cells which are covered
+        by the MOC, as described in the `pymoc.ranges` module.
+
+        >>> MOC(28, (5, 6, 8)).to_ranges().tolist()
+        [[20, 28], [32, 36]]
+        """
+
+        return self._get_coverage().copy()
+
+    @classmethod
+    def from_ranges(cls, ranges):
+        """Construct a new MOC from a collection of order 29 intervals.
+
+        The intervals (``[start, end)`` pairs) can be given in any order
+        and may overlap.  The resulting MOC is normalized.
+
+        >>> MOC.from_ranges([[20, 28], [32, 36]])
+        <MOC: [(28, [5, 6, 8])]>
+        """
+
+        moc = cls()
+
+        ranges = merge_ranges(ranges)
+
+        if ranges.size and (ranges[0, 0] < 0 or
+                            ranges[-1, 1] > 12 << (2 * MAX_ORDER)):
+            raise ValueError('Interval out of range')
+
+        for (order, ranges_i) in split_ranges(ranges):
+            moc._add_ranges(order, ranges_i)
+
+        moc._normalized = True
+
+        return moc
+
+    @classmethod
+    def open(cls, filename, filetype=None, **kwargs):
+        """Open a MOC file, deferring reading the cells until required.
+
+        For FITS files, the metadata are read from the header
+        immediately, and, for files written by PyMOC, the `order` and
+        `cells` properties can be determined from the header keywords,
+        where available, without reading the cells.  Any other use of the MOC causes the
+        cells to be read.
+
+        Any additional keyword arguments (kwargs) are passed on to
+        the `read` method when the cells are read.  These can include
+        `extname` or `mocid` to select a MOC from a FITS file
+        containing several.
+        """
+
+        moc = cls()
+
+        filename = as_file_object(filename)
+
+        if filetype is not None:
+            filetype = filetype.lower()
+        else:
+            filetype = moc._guess_file_type(filename)
+
+        # Note the position of a file object so that we can return to it
+        # when reading the cells.
+        position = filename.tell() if is_file_object(filename) else None
+
+        if filetype == 'fits':
+            from .io.fits import read_moc_fits_header
+            moc._header_values = read_moc_fits_header(
+                moc, filename,
+                extname=kwargs.get('extname'), mocid=kwargs.get('mocid'))
+
+        def loader(moc):
+            if position is not None:
+                filename.seek(position)
 
-                for cell in self[order_i]:
-                    flat.add(cell >> shift)
+            moc.read(filename, filetype, **kwargs)
 
-        return flat
+        moc._normalized = False
+        moc._loader = loader
 
-    def read(self, filename, filetype=None, include_meta=False, **kwargs):
+        return moc
+
+    def read(self, filename, filetype=None, include_meta=False, cache=None,
+             **kwargs):
         """Read data from the given file into the MOC object.
 
         The cell lists read from the file are added to the current
@@ -695,35 +956,84 @@ class MOC(object):
         cells, it will be updated to represent the union of the
         current coverge and that from the file.
 
-        The file type can be specified as "fits", "json" or "ascii",
-        with "text" allowed as an alias for "ascii".  If the type
+        The file type can be specified as "fits", "json", "ascii"
+        or "binary", with "text" allowed as an alias for "ascii".  If the type
         is not specified, then an attempt will be made to guess
         from the file name, or the contents of the file.
 
+        Instead of a file name, a binary file object (such as a `BytesIO`
+        object) or a bytes-like object containing the data can be given.
+        The file object must be seekable so that its type and compression
+        can be determined.
+
+        If a `cache` directory is specified, the cells read from a named
+        file are stored there in the binary format, and later reads of the
+        file, if it is unchanged, use the stored copy instead of parsing
+        the file.  (See :mod:`pymoc.io.cache`.)  FITS metadata are still
+        read from the file's header.  Errors writing to the cache
+        are ignored.
+
         Note that writing to FITS and JSON will cause the MOC
         to be normalized automatically.
 
         Any additional keyword arguments (kwargs) are passed on to
         the corresponding pymoc.io read functions (read_moc_fits,
-        read_moc_json or read_moc_ascii).
+        read_moc_json, read_moc_ascii or read_moc_binary).
         """
 
+        filename = as_file_object(filename)
+
         if filetype is not None:
             filetype = filetype.lower()
         else:
             filetype = self._guess_file_type(filename)
 
+        if cache is not None and not is_file_object(filename):
+            from .io.cache import cache_key, read_moc_cache, write_moc_cache
+            key = cache_key(filename, filetype, **kwargs)
+
+            if include_meta and filetype == 'fits':
+                from .io.fits import read_moc_fits_header
+                read_moc_fits_header(
+                    self, filename,
+                    extname=kwargs.get('extname'), mocid=kwargs.get('mocid'))
+
+            if not read_moc_cache(self, cache, key):
+                moc = MOC()
+                moc.read(filename, filetype, **kwargs)
+
+                # Failure to update the cache should not prevent us from
+                # using the MOC which we have read.
+                try:
+                    write_moc_cache(moc, cache, key)
+                except OSError:
+                    pass
+
+                self += moc
+
+            return
+
         if filetype == 'fits':
             from .io.fits import read_moc_fits
             read_moc_fits(self, filename, include_meta, **kwargs)
 
         elif filetype == 'json':
             from .io.json import read_moc_json
-            read_moc_json(self, filename, **kwargs)
+            if is_file_object(filename):
+                read_moc_json(self, file=open_file(filename, 'rb'), **kwargs)
+            else:
+                read_moc_json(self, filename, **kwargs)
 
         elif filetype == 'ascii' or filetype == 'text':
             from .io.ascii import read_moc_ascii
-            read_moc_ascii(self, filename, **kwargs)
+            if is_file_object(filename):
+                read_moc_ascii(self, file=open_file(filename, 'rb'), **kwargs)
+            else:
+                read_moc_ascii(self, filename, **kwargs)
+
+        elif filetype == 'binary':
+            from .io.binary import read_moc_binary
+            read_moc_binary(self, filename, **kwargs)
 
         else:
             raise ValueError('Unknown MOC file type {0}'.format(filetype))
@@ -732,17 +1042,22 @@ class MOC(object):
         """Write the coverage data in the MOC object to a file.
 
         The filetype can be given or left to be inferred as for the
-        read method.
+        read method.  A binary file object can be given instead of
+        a file name, in which case the file type must be specified.
 
         Any additional keyword arguments (kwargs) are passed on to
         the corresponding pymoc.io write functions (write_moc_fits,
-        write_moc_json or write_moc_ascii).  This can be used, for
-        example, to set overwrite=True (or clobber=True prior to
-        Astropy version 2.0) when writing FITS files.
+        write_moc_json, write_moc_ascii or write_moc_binary).
+        This can be used, for example, to set overwrite=True
+        (or clobber=True prior to Astropy version 2.0) when writing
+        FITS files.
         """
 
         if filetype is not None:
             filetype = filetype.lower()
+        elif is_file_object(filename):
+            raise ValueError('MOC file type must be specified when writing '
+                             'to a file object')
         else:
             filetype = self._guess_file_type(filename)
 
@@ -752,11 +1067,21 @@ class MOC(object):
 
         elif filetype == 'json':
             from .io.json import write_moc_json
-            write_moc_json(self, filename, **kwargs)
+            if is_file_object(filename):
+                write_moc_json(self, file=filename, **kwargs)
+            else:
+                write_moc_json(self, filename, **kwargs)
 
         elif filetype == 'ascii' or filetype == 'text':
             from .io.ascii import write_moc_ascii
-            write_moc_ascii(self, filename, **kwargs)
+            if is_file_object(filename):
+                write_moc_ascii(self, file=filename, **kwargs)
+            else:
+                write_moc_ascii(self, filename, **kwargs)
+
+        elif filetype == 'binary':
+            from .io.binary import write_moc_binary
+            write_moc_binary(self, filename, **kwargs)
 
         else:
             raise ValueError('Unknown MOC file type {0}'.format(filetype))
@@ -764,12 +1089,32 @@ class MOC(object):
     def _guess_file_type(self, filename):
         """Attempt to guess the type of a MOC file.
 
-        Returns "fits", "json" or "ascii" if successful and raised
-        a ValueError otherwise.
+        Returns "fits", "json", "ascii" or "binary" if successful and raises
+        a ValueError otherwise.  A binary file object can be given
+        instead of a file name, in which case its contents are examined
+        without changing its position.
         """
 
-        # First attempt to guess from the file name.
-        namelc = filename.lower()
+        if is_file_object(filename):
+            # Look at the first character, after decompression if
+            # necessary, and then return to the original position.
+            position = filename.tell()
+
+            try:
+                c = open_file(filename, 'rb').read(1)
+            finally:
+                filename.seek(position)
+
+            filetype = self._guess_file_type_contents(c)
+
+            if filetype is None:
+                raise ValueError('Unable to determine format of file object')
+
+            return filetype
+
+        # First attempt to guess from the file name, ignoring any
+        # compression extension.
+        namelc = compression_from_name(filename)[0].lower()
 
         if namelc.endswith('.fits') or namelc.endswith('.fit'):
             return 'fits'
@@ -777,21 +1122,259 @@ class MOC(object):
             return 'json'
         elif namelc.endswith('.txt') or namelc.endswith('.ascii'):
             return 'ascii'
+        elif namelc.endswith('.bmoc'):
+            return 'binary'
 
-        # Otherwise, if the file exists, look at the first character.
+        # Otherwise, if the file exists, look at the first character,
+        # after decompression if necessary.
         if isfile(filename):
-            with open(filename, 'r') as f:
-                c = f.read(1)
+            with open_file(filename, 'rb') as f:
+                filetype = self._guess_file_type_contents(f.read(1))
 
-            if c == 'S':
-                return 'fits'
-            elif c == '{':
-                return 'json'
-            elif c.isdigit():
-                return 'ascii'
+            if filetype is not None:
+                return filetype
 
         raise ValueError('Unable to determine format of {0}'.format(filename))
 
+    def _guess_file_type_contents(self, c):
+        """Guess the type of a MOC file from its first byte.
+
+        Returns None if the type is not recognized.
+        """
+
+        if c == b'S':
+            return 'fits'
+        elif c == b'{':
+            return 'json'
+        elif c.isdigit():
+            return 'ascii'
+        elif c == b'P':
+            return 'binary'
+
+        return None
+
+    def _add_ranges(self, order, ranges):
+        """Add a range set to the given order.
+
+        The range boundaries must lie on the boundaries of cells
+        at the given order.  As for cells added via the `add` method,
+        the range set is merged into the MOC when next required.
+        """
+
+        if ranges.size:
+            self._normalized = False
+            self._pending[order].append(ranges)
+
+    def _set_orders(self, orders, normalized=False):
+        """Replace the contents of the MOC with the given range sets.
+
+        A range set must be given for each order, in the form in which
+        they are stored.  They are used without being copied, so can be
+        read-only (for example memory-mapped) arrays.
+        """
+
+        self._loader = None
+        self._orders = list(orders)
+        for pending in self._pending:
+            del pending[:]
+        self._coverage.clear()
+        self._normalized = normalized
+
+    def _remove_ranges(self, ranges):
+        """Remove the area of the given range set from the MOC.
+
+        Cells at each order which overlap the range set are broken
+        up into the largest cells at higher orders which do not overlap it.
+        """
+
+        if not ranges.size:
+            return
+
+        remaining = [
+            split_ranges(ranges_difference(self._get_ranges(order), ranges),
+                         min_order=order)
+            for order in range(0, MAX_ORDER + 1)]
+
+        self._orders = [empty_ranges() for i in range(0, MAX_ORDER + 1)]
+
+        self._coverage.clear()
+
+        for split in remaining:
+            for (order, ranges_i) in split:
+                self._add_ranges(order, ranges_i)
+
+        self._normalized = False
+
+    def _get_ranges(self, order):
+        """Get the range set for the given order.
+
+        Any cells or range sets which have been added at this order
+        are first merged into the range set.  These are distinguished by
+        the number of dimensions of the pending array.
+        """
+
+        if self._loader is not None:
+            self._load()
+
+        pending = self._pending[order]
+
+        if pending:
+            ranges = [self._orders[order]]
+            ranges.extend(self._pending_ranges(order))
+
+            self._orders[order] = merge_ranges(np.concatenate(ranges))
+            self._coverage.clear()
+
+            del pending[:]
+
+        return self._orders[order]
+
+    def _pending_ranges(self, order):
+        """Get a list of range sets representing the cells or range sets
+        which have been added at the given order but not yet merged.
+        """
+
+        pending = self._pending[order]
+
+        ranges = [x for x in pending if x.ndim == 2]
+
+        cells = [x for x in pending if x.ndim == 1]
+        if cells:
+            ranges.append(cells_to_ranges(order, np.concatenate(cells)))
+
+        return ranges
+
+    def _load(self):
+        """Read the cells of a MOC which was opened lazily.
+
+        The cells read are combined with any which have already
+        been added.  If reading fails, the MOC remains unread.
+        """
+
+        loader = self._loader
+        header_values = self._header_values
+
+        self._loader = None
+        self._header_values = {}
+
+        try:
+            loader(self)
+
+        except Exception:
+            # Allow a further attempt, e.g. if the file is now available.
+            self._loader = loader
+            self._header_values = header_values
+            raise
+
+    def _get_header_value(self, name):
+        """Get a value determined from the header of a lazily opened MOC.
+
+        Returns None if the value is not available, or the MOC has
+        been modified or its cells read.
+        """
+
+        if self._loader is None or any(self._pending):
+            return None
+
+        return self._header_values.get(name)
+
+    def _get_cells(self, order):
+        """Get a sorted array of the cells at the given order."""
+
+        return ranges_to_cells(order, self._get_ranges(order))
+
+    def _get_coverage(self, max_order=MAX_ORDER):
+        """Get a range set representing the cells at all orders
+        up to the given order.
+
+        The result is cached until the MOC is next modified.
+        """
+
+        for order in range(0, max_order + 1):
+            self._get_ranges(order)
+
+        return self._get_merged_coverage(max_order)
+
+    def _get_merged_coverage(self, max_order):
+        """Get a range set representing the merged range sets at all
+        orders up to the given order, excluding any pending cells.
+
+        The result is cached until the range sets are next changed.
+        """
+
+        coverage = self._coverage.get(max_order)
+
+        if coverage is None:
+            coverage = self._coverage[max_order] = merge_ranges(
+                np.concatenate(self._orders[0:max_order + 1]))
+
+        return coverage
+
+    def _get_coverage_parts(self, max_order=MAX_ORDER):
+        """Get range sets which together represent the cells at all
+        orders up to the given order.
+
+        If there are only a few pending cells, relative to the square
+        root of the number of merged ranges, they are not merged into the
+        main range sets.  Instead the list of pending cells at each order
+        is collapsed into a single range set and these are returned
+        (merged together) as a separate part.  Otherwise the pending
+        cells are merged and the complete coverage is returned.
+        """
+
+        if self._loader is not None:
+            self._load()
+
+        orders = range(0, max_order + 1)
+
+        n_pending = 0
+
+        for order in orders:
+            pending = self._pending[order]
+
+            if pending:
+                pending[:] = [merge_ranges(np.concatenate(
+                    self._pending_ranges(order)))]
+
+            if pending:
+                n_pending += len(pending[0])
+
+        if not n_pending:
+            return [self._get_merged_coverage(max_order)]
+
+        n_merged = sum(len(self._orders[order]) for order in orders)
+
+        if n_pending > max(_max_pending_ranges, int(n_merged ** 0.5)):
+            return [self._get_coverage(max_order)]
+
+        return [
+            self._get_merged_coverage(max_order),
+            merge_ranges(np.concatenate(
+                [self._pending[order][0] for order in orders
+                 if self._pending[order]]))]
+
+    def _search_ranges(self, flat, positions):
+        """Find the index of the first range boundary after each position.
+
+        Searching is much faster for sorted positions, so if the positions
+        are not sorted, they are sorted for the search and the results
+        returned in the original order.
+        """
+
+        shape = positions.shape
+        positions = positions.ravel()
+
+        if positions.size < 2 or np.all(positions[1:] >= positions[:-1]):
+            index = np.searchsorted(flat, positions, side='right')
+
+        else:
+            sort_order = np.argsort(positions)
+            index = np.empty(positions.shape, dtype=np.intp)
+            index[sort_order] = np.searchsorted(
+                flat, positions[sort_order], side='right')
+
+        return index.reshape(shape)
+
     def _order_num_cells(self, order):
         """Determine the number of possible cells for an order."""
 
@@ -830,3 +1413,41 @@ class MOC(object):
                     order, max_cells - 1))
 
         return cell
+
+    def _validate_cells(self, order, cells):
+        """Check that the given cells are valid, returning them as an array.
+
+        The order is assumed already to have been validated.
+        """
+
+        max_cells = self._order_num_cells(order)
+
+        if not isinstance(cells, np.ndarray):
+            # Check other collections in Python, which is quicker
+            # for the few cells typically given this way.
+            try:
+                cells = [int(cell) for cell in cells]
+            except ValueError as e:
+                raise TypeError('MOC cell must be convertable to int')
+
+            if cells and not (0 <= min(cells) and max(cells) < max_cells):
+                raise ValueError(
+                    'MOC cell order {0} must be in range 0-{1}'.format(
+                        order, max_cells - 1))
+
+            return np.array(cells, dtype=np.int64)
+
+        try:
+            cells = cells.astype(np.int64)
+        except ValueError as e:
+            raise TypeError('MOC cell must be convertable to int')
+        except OverflowError as e:
+            cells = None
+
+        if cells is None or (cells.size and not (
+                0 <= cells.min() and cells.max() < max_cells)):
+            raise ValueError(
+                'MOC cell order {0} must be in range 0-{1}'.format(
+                    order, max_cells - 1))
+
+        return cells
@@ -0,0 +1,287 @@
+# Copyright (C) 2026 East Asian Observatory.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Range sets of HEALPix cells.
+
+A range set is a NumPy int64 array of shape (n, 2) giving
+``[start, end)`` intervals of cell numbers at order ``MAX_ORDER``.
+The functions in this module return range sets in which the intervals
+are sorted, disjoint and non-adjacent, and expect their range set
+arguments to be in this form too (other than :func:`merge_ranges`,
+which can be used to put an arbitrary collection of intervals into
+this form).
+
+Cells at a lower order are represented by the interval of order
+``MAX_ORDER`` cells which they contain.  For example cell 5 at
+order 28 becomes the interval ``[20, 24)``.
+"""
+
+from __future__ import absolute_import
+
+import numpy as np
+
+MAX_ORDER = 29
+
+
+def empty_ranges():
+    """Create an empty range set."""
+
+    return np.zeros((0, 2), dtype=np.int64)
+
+
+def cells_to_ranges(order, cells):
+    """Convert a collection of cells at the given order to a range set.
+
+    The cells should be given as an array (or other sequence) of
+    integers.  They need not be sorted and may contain duplicates.
+
+    >>> cells_to_ranges(28, [5, 6, 8]).tolist()
+    [[20, 28], [32, 36]]
+    """
+
+    cells = np.asarray(cells, dtype=np.int64).ravel()
+
+    if not cells.size:
+        return empty_ranges()
+
+    if not np.all(cells[1:] >= cells[:-1]):
+        cells = np.sort(cells)
+
+    # Find the positions at which a run of consecutive cells ends,
+    # ignoring duplicated cells.
+    cells = cells[np.concatenate(([True], np.diff(cells) != 0))]
+    breaks = np.flatnonzero(np.diff(cells) != 1)
+
+    starts = cells[np.concatenate(([0], breaks + 1))]
+    ends = cells[np.concatenate((breaks, [cells.size - 1]))] + 1
+
+    shift = 2 * (MAX_ORDER - order)
+
+    return np.column_stack((starts << shift, ends << shift))
+
+
+def ranges_to_cells(order, ranges):
+    """Expand a range set into a sorted array of cells at the given order.
+
+    The range boundaries must lie on the boundaries of cells at the
+    given order, as is the case for range sets constructed by
+    :func:`cells_to_ranges` at the same or a lower order.
+
+    >>> ranges_to_cells(28, [[20, 28], [32, 36]]).tolist()
+    [5, 6, 8]
+    """
+
+    ranges = np.asarray(ranges, dtype=np.int64).reshape((-1, 2))
+    shift = 2 * (MAX_ORDER - order)
+
+    starts = ranges[:, 0] >> shift
+    counts = (ranges[:, 1] >> shift) - starts
+
+    # Number each cell consecutively and then offset each run of numbers
+    # so that it begins at the start of its range.
+    offsets = starts - (np.cumsum(counts) - counts)
+
+    return (np.arange(counts.sum(), dtype=np.int64) +
+            np.repeat(offsets, counts))
+
+
+def ranges_length(ranges):
+    """Determine the number of order ``MAX_ORDER`` cells in a range set."""
+
+    return int((ranges[:, 1] - ranges[:, 0]).sum())
+
+
+def merge_ranges(ranges):
+    """Convert an arbitrary collection of intervals into a range set.
+
+    The intervals may be given in any order and may overlap.
+    Empty intervals are discarded.
+
+    >>> merge_ranges([[8, 12], [0, 4], [2, 6], [6, 7]]).tolist()
+    [[0, 7], [8, 12]]
+    """
+
+    ranges = np.asarray(ranges, dtype=np.int64).reshape((-1, 2))
+    ranges = ranges[ranges[:, 0] < ranges[:, 1]]
+
+    if not ranges.size:
+        return empty_ranges()
+
+    # Use a stable sort: this is linear when merging already-sorted
+    # range sets which have been concatenated.
+    ranges = ranges[np.argsort(ranges[:, 0], kind='stable')]
+    starts = ranges[:, 0]
+    ends = np.maximum.accumulate(ranges[:, 1])
+
+    # An interval begins a new range if it starts beyond the
+    # end of everything preceding it.
+    first = np.flatnonzero(np.concatenate(([True], starts[1:] > ends[:-1])))
+    last = np.concatenate((first[1:] - 1, [starts.size - 1]))
+
+    return np.column_stack((starts[first], ends[last]))
+
+
+def degrade_ranges(ranges, order):
+    """Expand a range set to the boundaries of cells at the given order.
+
+    Each range is extended so that the result is made up of whole
+    cells at the given order, including every cell which any
+    range overlaps.
+
+    >>> degrade_ranges([[1, 3], [9, 10]], 28).tolist()
+    [[0, 4], [8, 12]]
+    """
+
+    ranges = np.asarray(ranges, dtype=np.int64).reshape((-1, 2))
+    shift = 2 * (MAX_ORDER - order)
+
+    return merge_ranges(np.column_stack((
+        (ranges[:, 0] >> shift) << shift,
+        (((ranges[:, 1] - 1) >> shift) + 1) << shift)))
+
+
+def split_ranges(ranges, min_order=0):
+    """Split a range set into the largest cells which it contains.
+
+    Returns a list of (order, range set) pairs, in ascending order of
+    the order number, where the range boundaries for each order lie on
+    the boundaries of cells at that order.  Cells at orders lower than
+    ``min_order`` are not used -- their area is given at ``min_order``.
+
+    >>> for (order, ranges) in split_ranges([[12, 32]], min_order=27):
+    ...     print(order, ranges.tolist())
+    27 [[16, 32]]
+    28 [[12, 16]]
+    """
+
+    ranges = np.asarray(ranges, dtype=np.int64).reshape((-1, 2))
+    starts = ranges[:, 0]
+    ends = ranges[:, 1]
+
+    result = []
+
+    order = min_order
+
+    while starts.size:
+        # Skip orders at which even the longest range is too short
+        # to contain a whole cell.
+        longest = int((ends - starts).max())
+        order = max(order, MAX_ORDER - (longest.bit_length() - 1) // 2)
+
+        shift = 2 * (MAX_ORDER - order)
+
+        # Find the section of each range made up of whole cells.
+        first = ((starts + ((1 << shift) - 1)) >> shift) << shift
+        last = (ends >> shift) << shift
+        whole = first < last
+
+        if np.any(whole):
+            result.append((order, np.column_stack((
+                first[whole], last[whole]))))
+
+        # Keep the parts on either side to consider at the next order.
+        pieces = np.column_stack((
+            starts, np.where(whole, first, ends),
+            np.where(whole, last, ends), ends)).reshape((-1, 2))
+        pieces = pieces[pieces[:, 0] < pieces[:, 1]]
+
+        starts = pieces[:, 0]
+        ends = pieces[:, 1]
+
+        order += 1
+
+    return result
+
+
+def ranges_union(a, b):
+    """Compute the union of two range sets.
+
+    >>> ranges_union([[0, 4]], [[4, 8], [12, 16]]).tolist()
+    [[0, 8], [12, 16]]
+    """
+
+    a = np.asarray(a, dtype=np.int64).reshape((-1, 2))
+    b = np.asarray(b, dtype=np.int64).reshape((-1, 2))
+
+    if not a.size:
+        return b
+    elif not b.size:
+        return a
+
+    return merge_ranges(np.concatenate((a, b)))
+
+
+def ranges_intersection(a, b):
+    """Compute the intersection of two range sets.
+
+    >>> ranges_intersection([[0, 8], [12, 16]], [[4, 14]]).tolist()
+    [[4, 8], [12, 14]]
+    """
+
+    return _combine_ranges(a, b, np.logical_and)
+
+
+def ranges_difference(a, b):
+    """Compute the parts of the first range set not in the second.
+
+    >>> ranges_difference([[0, 8], [12, 16]], [[4, 14]]).tolist()
+    [[0, 4], [14, 16]]
+    """
+
+    return _combine_ranges(
+        a, b, lambda in_a, in_b: np.logical_and(in_a, np.logical_not(in_b)))
+
+
+def _combine_ranges(a, b, operation):
+    """Combine two range sets in a single sweep along their boundaries.
+
+    The given operation is applied to a pair of boolean arrays
+    indicating, for each interval between consecutive boundaries,
+    whether it is within each range set.  It should return a boolean
+    array indicating whether the interval is included in the result.
+    """
+
+    flat_a = np.asarray(a, dtype=np.int64).ravel()
+    flat_b = np.asarray(b, dtype=np.int64).ravel()
+    n_a = flat_a.size
+
+    points = np.concatenate((flat_a, flat_b))
+
+    if not points.size:
+        return empty_ranges()
+
+    # Record +1 at the start of each range and -1 at the end.
+    delta_a = np.zeros(points.shape, dtype=np.int8)
+    delta_a[0:n_a:2] = 1
+    delta_a[1:n_a:2] = -1
+    delta_b = np.zeros(points.shape, dtype=np.int8)
+    delta_b[n_a::2] = 1
+    delta_b[n_a + 1::2] = -1
+
+    # Merge the boundaries: a stable sort of two sorted runs is linear.
+    sort_order = np.argsort(points, kind='stable')
+    points = points[sort_order]
+    in_a = np.cumsum(delta_a[sort_order], dtype=np.int32) > 0
+    in_b = np.cumsum(delta_b[sort_order], dtype=np.int32) > 0
+
+    # Where several boundaries coincide, take the state after the last one.
+    last = np.concatenate((points[1:] != points[:-1], [True]))
+    points = points[last]
+    included = operation(in_a[last], in_b[last])
+
+    # Find where the included state changes.
+    change = np.diff(np.concatenate(([0], included.astype(np.int8))))
+
+    return np.column_stack((points[change == 1], points[change == -1]))
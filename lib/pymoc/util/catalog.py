@@ -1,4 +1,4 @@
-# Copyright (C) 2015-2017 East Asian Observatory.
+# Copyright (C) 2015-2026 East Asian Observatory.
 #
 # This program is free software: you can redistribute it and/or modify
 # it under the terms of the GNU General Public License as published by
@@ -15,7 +15,11 @@
 
 from __future__ import absolute_import
 
-from math import pi
+from collections import deque
+from functools import partial
+from itertools import islice
+from math import atan2, cos, pi, sin, sqrt
+from multiprocessing import Pool
 
 from astropy.coordinates import SkyCoord
 from astropy.io import ascii
@@ -27,26 +31,90 @@ from healpy.pixelfunc import \
 import numpy as np
 
 from ..moc import MOC
+from ..ranges import MAX_ORDER, cells_to_ranges, empty_ranges, \
+    merge_ranges, ranges_to_cells
 
+# Row and column offsets of each base cell, as used by HEALPix.
+_face_jrll = np.array((2, 2, 2, 2, 3, 3, 3, 3, 4, 4, 4, 4), dtype=np.int64)
+_face_jpll = np.array((1, 3, 5, 7, 0, 2, 4, 6, 1, 3, 5, 7), dtype=np.int64)
 
-def catalog_to_moc(catalog, radius, order, **kwargs):
+# Offsets of the sub-cells of a cell.
+_sub_cell = np.arange(4, dtype=np.int64)
+_sub_x = _sub_cell & 1
+_sub_y = _sub_cell >> 1
+
+# Radius, in units of the maximum cell radius, above which discs
+# are searched hierarchically rather than with Healpy `query_disc`.
+_hierarchical_min_radius = 48
+
+# Approximate number of candidate cells to consider at once when
+# searching discs hierarchically.
+_max_candidates = 2 ** 21
+
+
+def catalog_to_moc(catalog, radius, order, multi_order=False, **kwargs):
     """
     Convert a catalog to a MOC.
 
     The catalog is given as an Astropy SkyCoord object containing
     multiple coordinates.  The radius of catalog entries can be
     given as an Astropy Quantity (with units), otherwise it is assumed
-    to be in arcseconds.
+    to be in arcseconds.  It can be a single value or an array
+    giving the radius of each entry in the catalog.
+
+    Any additional keyword arguments are as for `catalog_to_cells`.
+    The cells are added to the MOC as ranges, so cells within the
+    discs around the catalog entries are not enumerated individually.
+
+    By default all of the cells are added at the given order.  If
+    `multi_order` is `True` then the MOC is instead constructed from
+    the largest cells which make up the area found, giving a
+    normalized MOC in which only the edges of the discs
+    are described by cells at the given order.
+    """
+
+    # Generate range set of MOC cells.
+    ranges = _catalog_to_ranges(catalog, radius, order, **kwargs)
+
+    return _ranges_to_moc(ranges, order, multi_order)
 
-    Any additional keyword arguments are passed on to `catalog_to_cells`.
+
+def catalog_chunks_to_moc(catalogs, radius, order, multi_order=False,
+                          **kwargs):
+    """
+    Convert a catalog, given in chunks, to a MOC.
+
+    The chunks of the catalog are given by an iterable of Astropy
+    SkyCoord objects, such as the generator returned by
+    `read_ascii_catalog_chunks`.  Each chunk is converted to a range set
+    as for `catalog_to_moc` (which takes the same arguments).
+    The range sets are merged periodically, whenever the unmerged range
+    sets have grown larger than the merged range set, so that the memory
+    required is limited by the size of the resulting MOC rather than
+    the size of the catalog.
+
+    If a number of `workers` is given, a single pool of processes is
+    used for all of the chunks, with only a few pieces of the catalog
+    per worker being read ahead of the results.
     """
 
-    # Generate list of MOC cells.
-    cells = catalog_to_cells(catalog, radius, order, **kwargs)
+    ranges = _catalogs_to_ranges(catalogs, radius, order, **kwargs)
+
+    return _ranges_to_moc(ranges, order, multi_order)
+
+
+def _ranges_to_moc(ranges, order, multi_order):
+    """Create a catalog MOC from a range set, as described for
+    `catalog_to_moc`."""
+
+    if multi_order:
+        moc = MOC.from_ranges(ranges)
+        moc.type = 'CATALOG'
+
+    else:
+        moc = MOC(moctype='CATALOG')
+        moc.add_ranges(order, ranges >> (2 * (MAX_ORDER - order)))
 
-    # Create new MOC object using our collection of cells.
-    moc = MOC(moctype='CATALOG')
-    moc.add(order, cells, no_validation=True)
     return moc
 
 
@@ -113,7 +181,9 @@ def _catalog_to_cells_neighbor(catalog, radius, order):
     return cells
 
 
-def catalog_to_cells(catalog, radius, order, include_fallback=True, **kwargs):
+def catalog_to_cells(catalog, radius, order, include_fallback=True,
+                     inclusive=False, fact=4, chunk_size=100000,
+                     workers=None):
     """
     Convert a catalog to a set of cells.
 
@@ -121,63 +191,589 @@ def catalog_to_cells(catalog, radius, order, include_fallback=True, **kwargs):
     is available for separate usage.  It takes the same arguments
     as that function.
 
-    This function uses the Healpy `query_disc` function to get a list
-    of cells for each item in the catalog in turn.  Additional keyword
-    arguments, if specified, are passed to `query_disc`.  This can include,
-    for example, `inclusive` (set to `True` to include cells overlapping
-    the radius as well as those with centers within it) and `fact`
-    (to control sampling when `inclusive` is specified).
+    The cells are found by the same method as the Healpy `query_disc`
+    function (for the "nested" scheme).  Where the radius is large
+    compared to the cells at the given order, this is applied to many
+    catalog positions at once, each with its own radius if an array
+    of radii was given.  Starting with the base cells, the cells
+    which are wholly inside each disc are accepted, those which are
+    wholly outside are discarded, and only those on the boundary are
+    divided into smaller cells to be examined at the next order.
+    The catalog is processed in chunks of `chunk_size` positions.
+    For smaller radii, `query_disc` is called for each position.
+
+    If `inclusive` is `True`, cells overlapping the radius are included
+    as well as those with centers within it.  As for `query_disc`,
+    this test is approximate: it examines sub-cells down to `fact`
+    times the resolution of the given order, where `fact` must
+    be a power of 2.
 
     If cells at the given order are bigger than the given radius, then
-    `query_disc` may find none inside the radius.  In this case,
+    there may be none inside the radius.  In this case,
     if `include_fallback` is `True` (the default), the cell at each
     position is included.
 
-    If the given radius is zero (or smaller) then Healpy `query_disc`
-    is not used -- instead the fallback position is used automatically.
+    If the given radius is zero (or smaller) then no disc query is
+    made -- instead the fallback position is used automatically.
+
+    If a number of `workers` is given, the chunks of the catalog are
+    processed in parallel by a pool of this many processes.  The chunk
+    size is reduced, if necessary, so that there is a chunk for each
+    worker.  The range sets found for the chunks are then merged.
     """
 
+    ranges = _catalog_to_ranges(
+        catalog, radius, order, include_fallback=include_fallback,
+        inclusive=inclusive, fact=fact, chunk_size=chunk_size,
+        workers=workers)
+
+    return set(ranges_to_cells(order, ranges).tolist())
+
+
+def _catalog_to_ranges(catalog, radius, order, include_fallback=True,
+                       inclusive=False, fact=4, chunk_size=100000,
+                       workers=None):
+    """
+    Convert a catalog to a range set.
+
+    This performs the work of the `catalog_to_cells` function,
+    and takes the same arguments, but returns a range set
+    (as used internally by the MOC class) rather than expanding
+    the ranges into individual cells.
+    """
+
+    return _catalogs_to_ranges(
+        (catalog,), radius, order, include_fallback=include_fallback,
+        inclusive=inclusive, fact=fact, chunk_size=chunk_size,
+        workers=workers)
+
+
+def _catalogs_to_ranges(catalogs, radius, order, include_fallback=True,
+                        inclusive=False, fact=4, chunk_size=100000,
+                        workers=None):
+    """
+    Convert an iterable of catalogs to a single range set.
+
+    Each catalog is divided into chunks, which are converted to range
+    sets, in a pool of processes if `workers` is specified.  The
+    range sets are merged periodically, as described for
+    `catalog_chunks_to_moc`.
+    """
+
+    if inclusive and (fact <= 0 or fact & (fact - 1)):
+        raise ValueError('fact must be a power of 2')
+
+    parallel = workers is not None and workers > 1
+
+    chunk_ranges = partial(
+        _chunk_to_ranges, order=order,
+        include_fallback=include_fallback, inclusive=inclusive, fact=fact)
+
+    chunks = _catalog_chunks(
+        catalogs, radius, chunk_size, workers if parallel else None)
+
+    if not parallel:
+        return _merge_ranges_periodically(
+            chunk_ranges(chunk) for chunk in chunks)
+
+    pool = Pool(workers)
+
+    try:
+        return _merge_ranges_periodically(
+            _imap_bounded(pool, chunk_ranges, chunks, 2 * workers))
+
+    finally:
+        pool.close()
+        pool.join()
+
+
+def _catalog_chunks(catalogs, radius, chunk_size, workers=None):
+    """
+    Generate chunks of the position vectors of an iterable of catalogs.
+
+    Each chunk is a tuple of the position vectors and the corresponding
+    radii in radians.  If a number of `workers` is given, the chunk size
+    is reduced, if necessary, so that each catalog is divided into
+    at least this many chunks.
+    """
+
+    radius = _radius_to_radians(radius)
+
+    for catalog in catalogs:
+        vectors = _catalog_to_vectors(catalog)
+
+        if radius.ndim == 0:
+            catalog_radius = np.full(len(vectors), radius.item())
+
+        elif radius.shape != (len(vectors),):
+            raise ValueError('radius array does not match the catalog')
+
+        else:
+            catalog_radius = radius
+
+        size = chunk_size
+
+        if workers is not None:
+            size = max(1, min(size, -(-len(vectors) // workers)))
+
+        for start in range(0, len(vectors), size):
+            yield (vectors[start:start + size],
+                   catalog_radius[start:start + size])
+
+
+def _imap_bounded(pool, function, iterable, limit):
+    """
+    Apply a function to each item of an iterable using a process pool.
+
+    This is like the pool's `imap` method, yielding the results in
+    order, but reads at most `limit` items ahead of the results
+    so that the iterable is not consumed all at once.
+    """
+
+    pending = deque()
+
+    for item in iterable:
+        pending.append(pool.apply_async(function, (item,)))
+
+        if len(pending) >= limit:
+            yield pending.popleft().get()
+
+    while pending:
+        yield pending.popleft().get()
+
+
+def _merge_ranges_periodically(ranges_iter):
+    """
+    Merge an iterable of range sets.
+
+    The range sets are merged whenever the unmerged range sets have
+    grown larger than the merged range set.
+    """
+
+    merged = empty_ranges()
+    pending = []
+    n_pending = 0
+
+    for ranges in ranges_iter:
+        pending.append(ranges)
+        n_pending += len(ranges)
+
+        if n_pending > len(merged):
+            pending.append(merged)
+            merged = merge_ranges(np.concatenate(pending))
+            pending = []
+            n_pending = 0
+
+    if pending:
+        pending.append(merged)
+        merged = merge_ranges(np.concatenate(pending))
+
+    return merged
+
+
+def _chunk_to_ranges(chunk, order, include_fallback, inclusive, fact):
+    """
+    Convert an array of position vectors to a range set.
+
+    This processes one chunk of a catalog for `_catalog_to_ranges`,
+    given as a tuple of the position vectors and an array of the
+    corresponding radii in radians.  It is a module-level function
+    so that it can be called by worker processes.
+    """
+
+    (vectors, radius) = chunk
+
     nside = 2 ** order
+    ranges = []
 
-    # Ensure catalog is in ICRS coordinates.
-    catalog = catalog.icrs
+    # Small discs are quicker to find one at a time using Healpy.
+    small = radius < _hierarchical_min_radius * _max_pixrad(order)
+    fallback = radius <= 0.0
+
+    for (query, selected) in (
+            (_query_discs_healpy, small & np.logical_not(fallback)),
+            (_query_discs, np.logical_not(small))):
+        if not np.any(selected):
+            continue
+
+        (disc_cells, found) = query(
+            order, vectors[selected], radius[selected], inclusive, fact)
+
+        for (disc_order, disc_cells_i) in disc_cells:
+            ranges.append(cells_to_ranges(disc_order, disc_cells_i))
+
+        if include_fallback:
+            fallback[np.flatnonzero(selected)[np.logical_not(found)]] = True
+
+    # Include the cell at each position for which the query didn't
+    # find anything.
+    vectors = vectors[fallback]
+    ranges.append(cells_to_ranges(order, vec2pix(
+        nside, vectors[:, 0], vectors[:, 1], vectors[:, 2], nest=True)))
+
+    return merge_ranges(np.concatenate(ranges))
+
+
+def _radius_to_radians(radius):
+    """Convert a radius to radians, assuming arcseconds if no
+    units are given."""
 
-    # Ensure radius is in radians.
     if isinstance(radius, Quantity):
-        radius = radius.to(radian).value
-    else:
-        radius = radius * pi / (180.0 * 3600.0)
+        return np.asarray(radius.to(radian).value, dtype=np.float64)
+
+    return np.asarray(radius, dtype=np.float64) * (pi / (180.0 * 3600.0))
+
+
+def _catalog_to_vectors(catalog):
+    """Convert a catalog to an (n, 3) array of ICRS position vectors."""
+
+    # Ensure catalog is in ICRS coordinates.
+    catalog = catalog.icrs
 
-    # Convert coordinates to position vectors.
     phi = catalog.ra.radian
     theta = (pi / 2) - catalog.dec.radian
 
-    vectors = ang2vec(theta, phi)
+    return ang2vec(theta, phi).reshape((-1, 3))
 
-    # Ensure we can iterate over vectors (it might be a single position).
-    if catalog.isscalar:
-        vectors = [vectors]
 
-    # Query for a list of cells for each catalog position.
-    cells = set()
-    for vector in vectors:
-        if radius > 0.0:
-            # Try "disc" query.
-            vector_cells = query_disc(nside, vector, radius, nest=True, **kwargs)
+def _query_discs_healpy(order, vectors, radius, inclusive=False, fact=4):
+    """
+    Find the cells within discs of the given radii (in radians)
+    around each of an array of position vectors, using the Healpy
+    `query_disc` function for each position in turn.
 
-            if vector_cells.size > 0:
-                cells.update(vector_cells.tolist())
-                continue
+    Returns the same values as `_query_discs`.
+    """
 
-            elif not include_fallback:
-                continue
+    nside = 2 ** order
+    found = np.zeros(len(vectors), dtype=np.bool_)
+    cells = [np.zeros(0, dtype=np.int64)]
 
-        # The query didn't find anything -- include the cell at the
-        # given position at least.
-        cell = vec2pix(nside, vector[0], vector[1], vector[2], nest=True)
-        cells.add(cell.item())
+    for (i, (vector, radius_i)) in enumerate(zip(vectors, radius)):
+        vector_cells = query_disc(
+            nside, vector, radius_i, inclusive=inclusive, fact=fact,
+            nest=True)
 
-    return cells
+        if vector_cells.size > 0:
+            cells.append(vector_cells)
+            found[i] = True
+
+    return ([(order, np.concatenate(cells))], found)
+
+
+def _query_discs(order, vectors, radius, inclusive=False, fact=4):
+    """
+    Find the cells within discs of the given radii (in radians)
+    around each of an array of position vectors.
+
+    The discs are divided into batches for `_query_discs_batch`,
+    based on an estimate of the number of cells along their edges,
+    so that the number of candidate cells considered at once
+    is approximately limited to `_max_candidates`.
+
+    Returns the same values as `_query_discs_batch`.
+    """
+
+    if inclusive:
+        max_order = min(order + fact.bit_length() - 1, MAX_ORDER)
+
+    else:
+        max_order = order
+
+    # Estimate the number of candidate cells from the circumference
+    # of each disc and the size of cells at the maximum order.
+    estimate = np.maximum(np.sin(radius), 0.0)
+    estimate *= 16 * pi * (2 ** max_order) / sqrt(pi / 3)
+    estimate += 48
+
+    batch = np.floor_divide(np.cumsum(estimate), _max_candidates)
+    boundaries = np.flatnonzero(np.diff(batch)) + 1
+
+    result = []
+    found = []
+
+    for (start, end) in zip(
+            np.concatenate(([0], boundaries)),
+            np.concatenate((boundaries, [len(vectors)]))):
+        (result_batch, found_batch) = _query_discs_batch(
+            order, vectors[start:end], radius[start:end], inclusive, fact)
+
+        result.extend(result_batch)
+        found.append(found_batch)
+
+    if not found:
+        return ([], np.zeros(0, dtype=np.bool_))
+
+    return (result, np.concatenate(found))
+
+
+def _query_discs_batch(order, vectors, radius, inclusive=False, fact=4):
+    """
+    Find the cells within discs of the given radii (in radians)
+    around each of an array of position vectors.
+
+    This follows the procedure of the HEALPix library's `query_disc`
+    method for the nested scheme, but processes all of the positions
+    together, one order at a time.  The cell centers and the disc
+    centers are computed in the same way as by that library so that
+    the same cells are found.
+
+    Returns a list of (order, cells) pairs, where the cells at orders
+    below the given order are wholly within a disc, and a boolean array
+    indicating for which positions any cells were found.
+    """
+
+    n_vector = len(vectors)
+    found = np.zeros(n_vector, dtype=np.bool_)
+
+    result = []
+    hits = []
+
+    # Discs of radius pi or more cover the whole sky.
+    whole = radius >= pi
+
+    if np.any(whole):
+        result.append((0, np.arange(12, dtype=np.int64)))
+        found[whole] = True
+
+    if inclusive:
+        max_order = min(order + fact.bit_length() - 1, MAX_ORDER)
+
+    else:
+        max_order = order
+
+    # Determine the position of each disc center in the form used
+    # by the HEALPix library.
+    (x, y, z) = (vectors[:, 0], vectors[:, 1], vectors[:, 2])
+    theta = np.arctan2(np.sqrt(x * x + y * y), z)
+    phi = np.where((x == 0.0) & (y == 0.0), 0.0, np.arctan2(y, x))
+    phi = np.where(phi < 0.0, phi + 2 * pi, phi)
+    phi = np.where(phi >= 2 * pi, np.fmod(phi, 2 * pi), phi)
+    z = np.cos(theta)
+    sin2 = 1.0 - z * z
+
+    # Candidate cells, with the index of the disc being considered
+    # (and its position and radius), the base cell and position within
+    # it, and, beyond the given order, the index of the parent cell at
+    # the given order (in `parents`).
+    index = np.repeat(np.flatnonzero(np.logical_not(whole)), 12)
+    disc_z = z[index]
+    disc_phi = phi[index]
+    disc_sin2 = sin2[index]
+    disc_radius = radius[index]
+    cells = np.tile(np.arange(12, dtype=np.int64), index.size // 12)
+    face = cells.copy()
+    ix = np.zeros(cells.shape, dtype=np.int64)
+    iy = np.zeros(cells.shape, dtype=np.int64)
+    parent = None
+    parents = None
+
+    for cell_order in range(0, max_order + 1):
+        if not cells.size:
+            break
+
+        # Compute the distance from each disc center, and hence
+        # whether the cell may overlap the disc, its center is within
+        # the disc, or it is wholly inside.
+        dr = _max_pixrad(cell_order)
+        cos_radius = np.cos(disc_radius)
+        cos_plus = np.where(
+            disc_radius + dr > pi, -1.0, np.cos(disc_radius + dr))
+        cos_minus = np.where(
+            disc_radius - dr < 0.0, 1.0, np.cos(disc_radius - dr))
+
+        (cell_z, cell_phi) = _xyf2zphi(cell_order, face, ix, iy)
+
+        cos_dist = np.subtract(disc_phi, cell_phi, out=cell_phi)
+        np.cos(cos_dist, out=cos_dist)
+        term = cell_z * cell_z
+        np.subtract(1.0, term, out=term)
+        term *= disc_sin2
+        np.sqrt(term, out=term)
+        cos_dist *= term
+        cos_dist += np.multiply(disc_z, cell_z, out=cell_z)
+
+        near = cos_dist > cos_plus
+        center = cos_dist >= cos_radius
+        center &= near
+
+        if cell_order < order:
+            # Cells can only be wholly inside discs larger than them.
+            inside = cos_dist > cos_minus
+            inside &= cos_minus < 1.0
+            inside &= center
+            result.append((cell_order, cells[inside]))
+            found[index[inside]] = True
+
+            descend = near & np.logical_not(inside)
+
+        elif cell_order == order:
+            # At the given order, cells which may overlap a disc
+            # are accepted if the search is inclusive and can not
+            # be refined further.
+            accept = near if inclusive and order == max_order else center
+            result.append((cell_order, cells[accept]))
+            found[index[accept]] = True
+
+            if order == max_order:
+                break
+
+            descend = near & np.logical_not(center)
+            parents = cells[descend]
+            parent = np.repeat(
+                np.arange(parents.size, dtype=np.int64), 4)
+
+        else:
+            # Beyond the given order, accept the parent cell if the
+            # center of any sub-cell is within the disc, or if any
+            # sub-cell at the maximum order may overlap it.
+            accept = center if cell_order < max_order else near
+            hits.append(parent[accept])
+            found[index[accept]] = True
+
+            if cell_order == max_order:
+                break
+
+            done = np.zeros(parents.size, dtype=np.bool_)
+            done[parent[accept]] = True
+
+            descend = near & np.logical_not(done[parent])
+
+            parent = np.repeat(parent[descend], 4)
+
+        # Divide the remaining candidates into their sub-cells.
+        index = np.repeat(index[descend], 4)
+        disc_z = np.repeat(disc_z[descend], 4)
+        disc_phi = np.repeat(disc_phi[descend], 4)
+        disc_sin2 = np.repeat(disc_sin2[descend], 4)
+        disc_radius = np.repeat(disc_radius[descend], 4)
+        face = np.repeat(face[descend], 4)
+        ix = ((ix[descend] << 1)[:, np.newaxis] + _sub_x).ravel()
+        iy = ((iy[descend] << 1)[:, np.newaxis] + _sub_y).ravel()
+        cells = ((cells[descend] << 2)[:, np.newaxis] + _sub_cell).ravel()
+
+    if hits:
+        result.append((order, parents[np.concatenate(hits)]))
+
+    return (result, found)
+
+
+def _max_pixrad(order):
+    """Compute the maximum angular distance between the center and
+    corners of cells at the given order, as the HEALPix library does."""
+
+    nside = 2 ** order
+
+    a = _vector_z_phi(2.0 / 3.0, pi / (4 * nside))
+    t = 1.0 - 1.0 / nside
+    t *= t
+    b = _vector_z_phi(1 - t / 3, 0.0)
+
+    return atan2(np.linalg.norm(np.cross(a, b)), np.dot(a, b))
+
+
+def _vector_z_phi(z, phi):
+    """Construct a unit vector from its z component and azimuth."""
+
+    sin_theta = sqrt((1.0 - z) * (1.0 + z))
+
+    return np.array((sin_theta * cos(phi), sin_theta * sin(phi), z))
+
+
+def _xyf2zphi(order, face, ix, iy):
+    """Compute the z coordinate and azimuth of the centers of cells,
+    given by base cell and position within it, as the HEALPix library
+    does."""
+
+    nside = 2 ** order
+    fact2 = 4.0 / (12 * nside * nside)
+    fact1 = (nside << 1) * fact2
+
+    jr = (_face_jrll[face] << order) - ix - iy - 1
+
+    north = jr < nside
+    south = jr > 3 * nside
+    nr = np.where(north, jr, np.where(south, 4 * nside - jr, nside))
+
+    tmp = (nr * nr) * fact2
+    z = np.where(north, 1 - tmp, np.where(
+        south, tmp - 1, (2 * nside - jr) * fact1))
+
+    tmp = _face_jpll[face] * nr + ix - iy
+    tmp += np.where(tmp < 0, 8 * nr, 0)
+
+    phi = np.where(
+        nr == nside,
+        0.75 * (pi / 2) * tmp * fact1,
+        (0.5 * (pi / 2) * tmp) / nr)
+
+    return (z, phi)
+
+
+def filter_catalog(moc, catalog, indices=False, chunk_size=1000000):
+    """
+    Determine which entries of a catalog fall within a MOC.
+
+    The catalog can be given as an Astropy SkyCoord object, or as a
+    pair of arrays of ICRS right ascension and declination.  These can
+    be Astropy Quantity objects (with units), otherwise they are assumed
+    to be in degrees.
+
+    The position of each catalog entry is converted to a cell at the
+    order of the MOC, and these cells are tested against the MOC
+    using its `contains_many` method.  The catalog is processed in chunks
+    of the given size, so that temporary arrays do not grow with the
+    size of the catalog.
+
+    Returns a boolean array indicating which catalog entries are within
+    the MOC, or an array of the indices of those entries if `indices`
+    is `True`.
+    """
+
+    order = moc.order
+    nside = 2 ** order
+
+    if isinstance(catalog, SkyCoord):
+        if catalog.isscalar:
+            catalog = catalog.reshape((1,))
+
+        n_entry = len(catalog)
+
+    else:
+        (ra, dec) = catalog
+
+        if isinstance(ra, Quantity):
+            ra = ra.to(degree).value
+        if isinstance(dec, Quantity):
+            dec = dec.to(degree).value
+
+        ra = np.atleast_1d(ra)
+        dec = np.atleast_1d(dec)
+        n_entry = ra.size
+
+    mask = np.zeros(n_entry, dtype=np.bool_)
+
+    for start in range(0, n_entry, chunk_size):
+        end = min(start + chunk_size, n_entry)
+
+        if isinstance(catalog, SkyCoord):
+            # Ensure catalog is in ICRS coordinates.
+            chunk = catalog[start:end].icrs
+            phi = chunk.ra.radian
+            theta = (pi / 2) - chunk.dec.radian
+
+        else:
+            phi = np.radians(ra[start:end])
+            theta = (pi / 2) - np.radians(dec[start:end])
+
+        cells = ang2pix(nside, theta, phi, nest=True)
+
+        mask[start:end] = moc.contains_many(order, cells)
+
+    if indices:
+        return np.flatnonzero(mask)
+
+    return mask
 
 
 def read_ascii_catalog(filename, format_, unit=None):
@@ -189,6 +785,100 @@ def read_ascii_catalog(filename, format_, unit=None):
     """
 
     catalog = ascii.read(filename, format=format_)
+
+    return _table_to_coords(catalog, unit)
+
+
+def read_ascii_catalog_chunks(filename, format_, unit=None,
+                              chunk_size=100000):
+    """
+    Read an ASCII catalog file in chunks using Astropy.
+
+    This is a generator which yields a SkyCoord object for each chunk of
+    (at most) `chunk_size` lines of the file, so that the whole catalog
+    need not be held in memory.  The chunks can be given to the
+    `catalog_chunks_to_moc` function.
+
+    The first chunk is read as for `read_ascii_catalog`.  The lines
+    preceding its first row of data are taken to be the header,
+    and are prepended to each subsequent chunk.  The format should
+    therefore be one in which each row is given on a single line.
+    """
+
+    header = None
+
+    with open(filename) as f:
+        while True:
+            lines = list(islice(f, chunk_size))
+
+            if header is None:
+                catalog = ascii.read(_lines_to_text(lines), format=format_)
+                header = _catalog_header(lines, len(catalog))
+
+            elif not lines:
+                break
+
+            elif not any(_is_catalog_row(line) for line in lines):
+                continue
+
+            else:
+                catalog = ascii.read(
+                    _lines_to_text(header + lines), format=format_)
+
+            yield _table_to_coords(catalog, unit)
+
+            if len(lines) < chunk_size:
+                break
+
+
+def _lines_to_text(lines):
+    """Join lines of a catalog file so that they can be given
+    to the Astropy ASCII reader."""
+
+    text = ''.join(lines)
+
+    # Ensure that the text is not mistaken for a file name.
+    if not text.endswith('\n'):
+        text += '\n'
+
+    return text
+
+
+def _is_catalog_row(line):
+    """Determine whether a line of a catalog file may contain
+    a row (or column names) rather than being blank or a comment."""
+
+    line = line.strip()
+
+    return bool(line) and not line.startswith('#')
+
+
+def _catalog_header(lines, n_row):
+    """Find the header lines of a catalog file.
+
+    Given the lines of the first chunk of the file, and the number of
+    rows of data which they were found to contain, this returns the
+    lines up to and including the last line which was not a row
+    of data.
+    """
+
+    n_header = sum(1 for line in lines if _is_catalog_row(line)) - n_row
+
+    for (i, line) in enumerate(lines):
+        if n_header <= 0:
+            if _is_catalog_row(line):
+                return lines[:i]
+
+        elif _is_catalog_row(line):
+            n_header -= 1
+
+    return list(lines)
+
+
+def _table_to_coords(catalog, unit):
+    """Convert an Astropy table to a SkyCoord object, as described
+    for `read_ascii_catalog`."""
+
     columns = catalog.columns
 
     if 'RA' in columns and 'Dec' in columns:
@@ -1,5 +1,5 @@
 # Copyright (C) 2014 Science and Technology Facilities Council.
-# Copyright (C) 2015-2017 East Asian Observatory.
+# Copyright (C) 2015-2026 East Asian Observatory.
 #
 # This program is free software: you can redistribute it and/or modify
 # it under the terms of the GNU General Public License as published by
@@ -89,6 +89,7 @@ class MOCTool(object):
         """
 
         self.moc = None
+        self.cache = None
 
     def run(self, params):
         """Main run method for PyMOC tool.
@@ -132,10 +133,10 @@ class MOCTool(object):
         """
 
         if self.moc is None:
-            self.moc = MOC(filename=filename)
+            self.moc = self._read_new_moc(filename)
 
         else:
-            self.moc.read(filename)
+            self.moc.read(filename, cache=self.cache)
 
     def read_moc_stdin(self):
         """Read from stdin into the current running MOC object.
@@ -150,6 +151,23 @@ class MOCTool(object):
 
         read_moc_ascii(self.moc, file=sys.stdin)
 
+    @command('--cache')
+    def set_cache(self):
+        """Use a cache directory for input files.
+
+        The cells read from each subsequent input file are stored in the
+        given directory in PyMOC's binary format.  Later invocations
+        which read the same (unmodified) file will use the stored copy
+        instead of parsing the file again.  The least recently used
+        entries are removed when the cache exceeds 1 GiB.
+
+        ::
+
+            pymoctool --cache ~/.cache/pymoc large.fits --info
+        """
+
+        self.cache = self.params.pop()
+
     @command('--catalog')
     def catalog(self):
         """Create MOC from catalog of coordinates.
@@ -172,6 +190,9 @@ class MOCTool(object):
                 [unit (hour | deg | rad) (deg | rad)]
                 [format commented_header]
                 [inclusive]
+                [multiorder]
+                [workers 4]
+                [chunk 100000]
 
         Units (if not specified) are assumed to be hours and degrees for ICRS
         coordinates and degrees for galactic coordinates.  The format, if not
@@ -183,15 +204,25 @@ class MOCTool(object):
             # RA Dec
             01:30:00 +45:00:00
             22:30:00 +45:00:00
+
+        With the "multiorder" option, the MOC is built from the largest
+        cells covering the catalog regions rather than from cells
+        at the given order.  The "workers" option specifies a number
+        of processes among which to divide the catalog.  If a "chunk"
+        size is given, the catalog is read and processed in chunks
+        of this number of lines, so that the whole catalog is not
+        held in memory.
         """
 
-        from .catalog import catalog_to_moc, read_ascii_catalog
+        from .catalog import catalog_to_moc, catalog_chunks_to_moc, \
+            read_ascii_catalog, read_ascii_catalog_chunks
 
         filename = self.params.pop()
         order = 12
         radius = 3600
         unit = None
         format_ = 'commented_header'
+        chunk_size = None
         kwargs = {}
 
         while self.params:
@@ -212,11 +243,27 @@ class MOCTool(object):
             elif self.params[-1] == 'inclusive':
                 self.params.pop()
                 kwargs['inclusive'] = True
+            elif self.params[-1] == 'multiorder':
+                self.params.pop()
+                kwargs['multi_order'] = True
+            elif self.params[-1] == 'workers':
+                self.params.pop()
+                kwargs['workers'] = int(self.params.pop())
+            elif self.params[-1] == 'chunk':
+                self.params.pop()
+                chunk_size = int(self.params.pop())
             else:
                 break
 
-        coords = read_ascii_catalog(filename, format_=format_, unit=unit)
-        catalog_moc = catalog_to_moc(coords, radius, order, **kwargs)
+        if chunk_size is None:
+            coords = read_ascii_catalog(filename, format_=format_, unit=unit)
+            catalog_moc = catalog_to_moc(coords, radius, order, **kwargs)
+
+        else:
+            chunks = read_ascii_catalog_chunks(
+                filename, format_=format_, unit=unit, chunk_size=chunk_size)
+            catalog_moc = catalog_chunks_to_moc(
+                chunks, radius, order, **kwargs)
 
         if self.moc is None:
             self.moc = catalog_moc
@@ -303,7 +350,7 @@ class MOCTool(object):
             raise CommandError('No MOC information present for intersection')
 
         filename = self.params.pop()
-        self.moc = self.moc.intersection(MOC(filename=filename))
+        self.moc = self.moc.intersection(self._read_new_moc(filename))
 
     @command('--name')
     def name(self):
@@ -370,7 +417,7 @@ class MOCTool(object):
             raise CommandError('No MOC information present for subtraction')
 
         filename = self.params.pop()
-        self.moc -= MOC(filename=filename)
+        self.moc -= self._read_new_moc(filename)
 
     @command('--plot')
     def plot(self):
@@ -428,6 +475,13 @@ class MOCTool(object):
 
         print('PyMOC', version)
 
+    def _read_new_moc(self, filename):
+        """Read a file into a new MOC object, including metadata."""
+
+        moc = MOC()
+        moc.read(filename, include_meta=True, cache=self.cache)
+        return moc
+
     def _split_docstring(self, docstring):
         """Separate a docstring into the synopsis (first line) and body."""
 
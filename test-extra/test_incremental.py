@@ -0,0 +1,62 @@
+# Copyright (C) 2026 East Asian Observatory.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from unittest import TestCase
+
+import numpy as np
+
+from pymoc import MOC
+
+
+class IncrementalTestCase(TestCase):
+    def test_add_contains_large(self):
+        # MOC with 2M separate ranges at order 14.
+        order = 14
+        m = MOC()
+        m.add(order, np.arange(0, 4000000, 2))
+        self.assertTrue(m.contains(order, 0))
+
+        # Alternately adding and testing cells should not require
+        # the whole MOC to be merged each time: count the number of
+        # times the main range set is replaced.
+        merged = m._orders[order]
+        n_merge = 0
+
+        for i in range(0, 2000):
+            m.add(order, (4000000 + 3 * i,))
+            self.assertTrue(m.contains(order, 4000000 + 3 * i))
+            self.assertFalse(m.contains(order, 4000001 + 3 * i))
+
+            if m._orders[order] is not merged:
+                merged = m._orders[order]
+                n_merge += 1
+
+        # Pending cells are merged once they exceed the square root
+        # of the number of ranges (about 1400 here).
+        self.assertLessEqual(n_merge, 2)
+
+        self.assertEqual(m.cells, 2002000)
+
+    def test_add_single_cells(self):
+        m = MOC()
+
+        for i in range(0, 100000):
+            m.add(14, (3 * i,))
+
+        # Adding cells should only append them to the pending list.
+        self.assertEqual(m._orders[14].size, 0)
+        self.assertEqual(len(m._pending[14]), 100000)
+
+        self.assertEqual(m.cells, 100000)
@@ -20,6 +20,7 @@ from io import StringIO
 from unittest import TestCase
 
 from pymoc import MOC
+import pymoc.io.ascii
 from pymoc.io.ascii import read_moc_ascii, write_moc_ascii
 
 
@@ -86,3 +87,70 @@ class ASCIITestCase(TestCase):
         self.assertEqual(copy[29], frozenset([
             3458700000000000000, 3458700000000000007,
             3458700000000000008, 3458700000000000009]))
+
+    def test_ascii_moc2(self):
+        # Check the MOC 2.0 form with whitespace separators and orders
+        # split over multiple lines.
+        in_ = StringIO('1/1 3 4\n2/4 25\n12-14\n  21\n3/\n')
+
+        moc = MOC()
+        read_moc_ascii(moc, file=in_)
+
+        self.assertEqual(moc[1], frozenset([1, 3, 4]))
+        self.assertEqual(moc[2], frozenset([4, 12, 13, 14, 21, 25]))
+        self.assertEqual(moc[3], frozenset())
+
+        with self.assertRaises(ValueError):
+            read_moc_ascii(MOC(), file=StringIO('5 6 7'))
+
+    def test_ascii_buffer(self):
+        # Read with a small buffer to check tokens split between chunks.
+        test_ascii = '1/1,3,4 2/4,25,12-14,21 10/100-200,300 11/6'
+        expect = MOC()
+        read_moc_ascii(expect, file=StringIO(test_ascii))
+
+        (buffer_size, batch_size) = (pymoc.io.ascii.read_buffer_size,
+                                     pymoc.io.ascii.read_batch_size)
+        try:
+            for size in (1, 2, 3, 5, 7):
+                pymoc.io.ascii.read_buffer_size = size
+                pymoc.io.ascii.read_batch_size = size
+
+                moc = MOC()
+                read_moc_ascii(moc, file=StringIO(test_ascii))
+
+                self.assertEqual(repr(moc), repr(expect))
+
+        finally:
+            pymoc.io.ascii.read_buffer_size = buffer_size
+            pymoc.io.ascii.read_batch_size = batch_size
+
+    def test_ascii_long_range(self):
+        # Check that a long range is not expanded into individual cells.
+        in_ = StringIO('29/0-99999999999')
+
+        moc = MOC()
+        read_moc_ascii(moc, file=in_)
+
+        self.assertEqual(moc.cells, 100000000000)
+        self.assertTrue(moc.contains(29, 99999999999))
+        self.assertFalse(moc.contains(29, 100000000000))
+
+    def test_ascii_write_chunks(self):
+        moc = MOC()
+        moc.add(2, [4, 12, 13, 14, 21, 25, 26, 30, 31, 32, 33])
+        moc.add(5, [1000])
+
+        expect = '2/4,12-14,21,25,26,30-33 5/1000'
+
+        chunk_size = pymoc.io.ascii.write_chunk_size
+        try:
+            for size in (1, 2, 3, 100):
+                pymoc.io.ascii.write_chunk_size = size
+
+                out = StringIO()
+                write_moc_ascii(moc, file=out)
+                self.assertEqual(out.getvalue(), expect)
+
+        finally:
+            pymoc.io.ascii.write_chunk_size = chunk_size
@@ -0,0 +1,103 @@
+# Copyright (C) 2026 East Asian Observatory.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+from shutil import rmtree
+from tempfile import mkdtemp
+from unittest import TestCase
+
+from pymoc import MOC
+from pymoc.io.binary import open_moc_binary, read_moc_binary, \
+    write_moc_binary
+
+
+class BinaryTestCase(TestCase):
+    def setUp(self):
+        self.tmpdir = mkdtemp()
+        self.filename = os.path.join(self.tmpdir, 'test.bmoc')
+
+    def tearDown(self):
+        rmtree(self.tmpdir)
+
+    def test_binary(self):
+        orig = MOC()
+        orig.add(0, [11])
+        orig.add(10, [5, 6, 7, 8])
+        orig.add(11, [1000, 1001, 2000])
+        orig.add(29, [3458700000000000000])
+
+        for encoding in ('RANGE', 'nuniq'):
+            for checksum in (False, True):
+                write_moc_binary(orig, self.filename, encoding=encoding,
+                                 checksum=checksum)
+
+                copy = open_moc_binary(self.filename, verify=checksum)
+
+                self.assertEqual(copy.order, 29)
+                self.assertEqual(repr(copy), repr(orig))
+
+                # Check that the MOC can be modified.
+                copy.add(10, [9])
+                copy.remove(11, [1001])
+                self.assertEqual(copy[10], frozenset([5, 6, 7, 8, 9]))
+                self.assertEqual(copy[11], frozenset([1000, 2000]))
+
+                copy = MOC(1, [0])
+                read_moc_binary(copy, self.filename)
+                self.assertEqual(copy, orig + MOC(1, [0]))
+
+        # Check the MOC class can determine the file type.
+        orig.normalize()
+        orig.write(self.filename)
+        copy = MOC(filename=self.filename)
+        self.assertEqual(repr(copy), repr(orig))
+        self.assertTrue(open_moc_binary(self.filename).normalized)
+
+        alternative = os.path.join(self.tmpdir, 'test.dat')
+        os.rename(self.filename, alternative)
+        self.assertEqual(MOC(filename=alternative), orig)
+
+    def test_binary_empty(self):
+        for encoding in ('RANGE', 'NUNIQ'):
+            write_moc_binary(MOC(), self.filename, encoding=encoding)
+
+            self.assertEqual(open_moc_binary(self.filename).cells, 0)
+
+    def test_binary_invalid(self):
+        write_moc_binary(MOC(5, [100, 200]), self.filename, checksum=True)
+
+        with open(self.filename, 'r+b') as f:
+            f.seek(-8, 2)
+            f.write(b'\x01')
+
+        # The checksum is only checked if requested.
+        open_moc_binary(self.filename)
+
+        with self.assertRaises(ValueError):
+            open_moc_binary(self.filename, verify=True)
+
+        write_moc_binary(MOC(5, [100, 200]), self.filename)
+
+        with self.assertRaises(ValueError):
+            open_moc_binary(self.filename, verify=True)
+
+        with open(self.filename, 'wb') as f:
+            f.write(b'SIMPLE  =                    T')
+
+        with self.assertRaises(ValueError):
+            open_moc_binary(self.filename)
+
+        with self.assertRaises(ValueError):
+            write_moc_binary(MOC(), self.filename, encoding='NESTED')
@@ -0,0 +1,90 @@
+# Copyright (C) 2026 East Asian Observatory.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import gzip
+from io import BytesIO
+from unittest import TestCase
+
+from pymoc import MOC
+from pymoc.io.binary import open_moc_binary
+
+
+class BufferTestCase(TestCase):
+    def test_buffer(self):
+        orig = MOC()
+        orig.add(8, [10, 11, 12, 500])
+        orig.add(12, range(1000, 1100))
+
+        for filetype in ('fits', 'json', 'ascii', 'binary'):
+            buff = BytesIO()
+            orig.write(buff, filetype=filetype)
+            data = buff.getvalue()
+
+            # Read from a file object, with the type guessed from
+            # the contents.
+            buff.seek(0)
+            copy = MOC()
+            copy.read(buff)
+            self.assertEqual(copy, orig)
+
+            # The file object should remain open for further use.
+            self.assertFalse(buff.closed)
+            buff.seek(0)
+            copy = MOC()
+            copy.read(buff, filetype=filetype)
+            self.assertEqual(copy, orig)
+
+            # Open lazily, from a file object and from bytes.
+            for contents in (BytesIO(data), data, gzip.compress(data)):
+                copy = MOC.open(contents)
+                self.assertEqual(copy, orig)
+
+            buff.seek(0)
+            copy = MOC.open(buff)
+            self.assertEqual(copy.order, orig.order)
+            self.assertEqual(copy, orig)
+            self.assertFalse(buff.closed)
+
+            # Read from bytes, both as given and compressed.
+            for contents in (data, gzip.compress(data)):
+                copy = MOC()
+                copy.read(contents)
+                self.assertEqual(copy, orig)
+
+                copy = MOC()
+                copy.read(bytearray(contents), filetype=filetype)
+                self.assertEqual(copy, orig)
+
+        with self.assertRaises(ValueError):
+            orig.write(BytesIO())
+
+        with self.assertRaises(ValueError):
+            MOC().read(b'xyz')
+
+    def test_binary_bytes(self):
+        orig = MOC(10, [4, 5, 6, 100])
+
+        buff = BytesIO()
+        orig.write(buff, filetype='binary', checksum=True)
+        data = buff.getvalue()
+
+        copy = open_moc_binary(data, verify=True)
+        self.assertEqual(copy, orig)
+
+        with self.assertRaises(ValueError):
+            open_moc_binary(data[:40])
+
+        with self.assertRaises(ValueError):
+            open_moc_binary(BytesIO(data[:40]))
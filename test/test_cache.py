@@ -0,0 +1,117 @@
+# Copyright (C) 2026 East Asian Observatory.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+from shutil import rmtree
+from tempfile import mkdtemp
+from unittest import TestCase
+
+from pymoc import MOC
+from pymoc.io.cache import cache_key, prune_cache
+
+
+class CacheTestCase(TestCase):
+    def setUp(self):
+        self.tmpdir = mkdtemp()
+        self.cachedir = os.path.join(self.tmpdir, 'cache')
+
+    def tearDown(self):
+        rmtree(self.tmpdir)
+
+    def test_cache(self):
+        orig = MOC(name='test', mocid='ivo://test')
+        orig.add(8, [10, 11, 12, 500])
+        orig.add(12, range(1000, 1100))
+
+        filename = os.path.join(self.tmpdir, 'test.fits')
+        orig.write(filename)
+        key = cache_key(filename, 'fits')
+
+        # The first read should populate the cache.
+        copy = MOC()
+        copy.read(filename, include_meta=True, cache=self.cachedir)
+        self.assertEqual(copy, orig)
+        self.assertEqual(os.listdir(self.cachedir), [key + '.bmoc'])
+
+        # Replace the cache entry to check that it is used, and that
+        # the metadata are still read from the file.
+        MOC(4, [1]).write(
+            os.path.join(self.cachedir, key + '.bmoc'), filetype='binary')
+
+        copy = MOC()
+        copy.read(filename, include_meta=True, cache=self.cachedir)
+        self.assertEqual(copy, MOC(4, [1]))
+        self.assertEqual(copy.name, 'test')
+        self.assertEqual(copy.id, 'ivo://test')
+
+        # Modifying the file should give a new cache key.
+        orig.add(10, [7])
+        orig.write(filename, overwrite=True)
+        os.utime(filename, ns=(0, 0))
+        self.assertNotEqual(cache_key(filename, 'fits'), key)
+
+        copy = MOC()
+        copy.read(filename, cache=self.cachedir)
+        self.assertEqual(copy, orig)
+        self.assertEqual(len(os.listdir(self.cachedir)), 2)
+
+        # Other reading options should also give a new key.
+        self.assertNotEqual(cache_key(filename, 'fits'),
+                            cache_key(filename, 'fits', extname='MOC'))
+
+    def test_prune(self):
+        for i in range(0, 4):
+            filename = os.path.join(self.tmpdir, 'test{0}.txt'.format(i))
+            MOC(10, range(0, 1000, 2 + i)).write(filename)
+            MOC().read(filename, cache=self.cachedir)
+
+        names = sorted(os.listdir(self.cachedir))
+        self.assertEqual(len(names), 4)
+        sizes = {}
+
+        for (i, name) in enumerate(names):
+            entry = os.path.join(self.cachedir, name)
+            os.utime(entry, (1000 * i, 1000 * i))
+            sizes[name] = os.stat(entry).st_size
+
+        # Pruning should remove the least recently used entries first.
+        prune_cache(self.cachedir, sizes[names[2]] + sizes[names[3]])
+        self.assertEqual(sorted(os.listdir(self.cachedir)), names[2:])
+
+        prune_cache(self.cachedir, 0)
+        self.assertEqual(os.listdir(self.cachedir), [])
+
+    def test_invalid_cache(self):
+        orig = MOC(10, [5, 6, 7])
+        filename = os.path.join(self.tmpdir, 'test.txt')
+        orig.write(filename)
+
+        # Cache paths which can not be used as directories should not
+        # prevent the file from being read.
+        notdir = os.path.join(self.tmpdir, 'notdir')
+        with open(notdir, 'w') as f:
+            f.write('not a directory')
+
+        for cachedir in (notdir, os.path.join(notdir, 'cache')):
+            copy = MOC()
+            copy.read(filename, cache=cachedir)
+            self.assertEqual(copy, orig)
+
+        # An existing directory should be used.
+        os.mkdir(self.cachedir)
+        copy = MOC()
+        copy.read(filename, cache=self.cachedir)
+        self.assertEqual(copy, orig)
+        self.assertEqual(len(os.listdir(self.cachedir)), 1)
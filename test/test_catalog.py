@@ -1,4 +1,4 @@
-# Copyright (C) 2017 East Asian Observatory.
+# Copyright (C) 2017-2026 East Asian Observatory.
 #
 # This program is free software: you can redistribute it and/or modify
 # it under the terms of the GNU General Public License as published by
@@ -13,12 +13,23 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import os
+from shutil import rmtree
+from multiprocessing import Pool
+from tempfile import mkdtemp
 from unittest import TestCase
+from unittest.mock import patch
 
 from astropy.coordinates import SkyCoord
+from astropy.units import degree, radian
+from healpy import query_disc
+from healpy.pixelfunc import ang2vec
+import numpy as np
 
 from pymoc import MOC
-from pymoc.util.catalog import catalog_to_moc, catalog_to_cells
+from pymoc.util.catalog import catalog_to_moc, catalog_to_cells, \
+    catalog_chunks_to_moc, filter_catalog, read_ascii_catalog, \
+    read_ascii_catalog_chunks
 
 
 class CatalogTestCase(TestCase):
@@ -63,6 +74,82 @@ class CatalogTestCase(TestCase):
         cells = catalog_to_cells(catalog, 0, 12, inclusive=True)
         self.assertEqual(cells, set((12344,)))
 
+    def test_cells_large_radius(self):
+        # Radius large enough for cells to be found hierarchically:
+        # compare to the result of Healpy "query_disc".
+        ra = [0.0, 45.0, 100.0, 200.0, 300.0, 10.0]
+        dec = [90.0, 1.304, 40.0, 60.0, -45.0, -89.9]
+        catalog = SkyCoord(ra, dec, frame='icrs', unit='deg')
+        vectors = ang2vec(np.radians(90.0 - np.array(dec)), np.radians(ra))
+
+        for (radius, order) in ((15.0, 8), (2.0, 11), (0.5, 13), (1.0, 8)):
+            for (inclusive, fact) in ((False, 4), (True, 1), (True, 4)):
+                expected = set()
+                for vector in vectors:
+                    expected.update(query_disc(
+                        2 ** order, vector, np.radians(radius),
+                        inclusive=inclusive, fact=fact, nest=True).tolist())
+
+                cells = catalog_to_cells(
+                    catalog, radius * degree, order, inclusive=inclusive,
+                    fact=fact, chunk_size=4)
+                self.assertEqual(cells, expected)
+
+                moc = catalog_to_moc(
+                    catalog, radius * degree, order, inclusive=inclusive,
+                    fact=fact)
+                self.assertEqual(set(moc.flattened(order)), expected)
+
+        with self.assertRaises(ValueError):
+            catalog_to_cells(catalog, 3600, 6, inclusive=True, fact=3)
+
+    def test_cells_radius_array(self):
+        ra = [0.0, 45.0, 100.0, 200.0, 300.0, 10.0, 150.0]
+        dec = [90.0, 1.304, 40.0, 60.0, -45.0, -89.9, -45.0]
+        catalog = SkyCoord(ra, dec, frame='icrs', unit='deg')
+        radius = [3600.0, 0.0, 60.0, 7200.0, 36000.0, 1.0, 200.0 * 3600]
+
+        for order in (6, 8):
+            for inclusive in (False, True):
+                expected = set()
+                for (i, radius_i) in enumerate(radius):
+                    expected.update(catalog_to_cells(
+                        catalog[i:i + 1], radius_i, order,
+                        inclusive=inclusive))
+
+                cells = catalog_to_cells(
+                    catalog, radius, order, inclusive=inclusive,
+                    chunk_size=3)
+                self.assertEqual(cells, expected)
+
+                moc = catalog_to_moc(
+                    catalog, np.array(radius) / 3600 * degree, order,
+                    inclusive=inclusive, multi_order=True)
+                self.assertEqual(set(moc.flattened(order)), expected)
+
+        # Without fallback, nothing is found for the small radius.
+        self.assertEqual(catalog_to_cells(
+            catalog[2:3], [60.0], 6, include_fallback=False), set())
+
+        with self.assertRaises(ValueError):
+            catalog_to_cells(catalog, radius[1:], 10)
+
+    def test_cells_workers(self):
+        catalog = SkyCoord(
+            [0.0, 45.0, 100.0, 200.0, 300.0, 10.0, 150.0],
+            [90.0, 1.304, 40.0, 60.0, -45.0, -89.9, -45.0],
+            frame='icrs', unit='deg')
+
+        for (radius, order) in ((3600, 7), (10 * degree, 10), (0, 12)):
+            expected = catalog_to_cells(catalog, radius, order)
+
+            cells = catalog_to_cells(catalog, radius, order, workers=3)
+            self.assertEqual(cells, expected)
+
+            moc = catalog_to_moc(catalog, radius, order, workers=2,
+                                 multi_order=True)
+            self.assertEqual(set(moc.flattened(order)), expected)
+
     def test_catalog(self):
         catalog = SkyCoord([150.0, 300.0], [-45.0, 45.0],
                            frame='icrs', unit='deg')
@@ -82,3 +169,103 @@ class CatalogTestCase(TestCase):
             10316511438441, 10316511438443, 10316511438456, 10316511438457])
 
         self.assertEqual(moc, expected)
+
+    def test_catalog_multi_order(self):
+        catalog = SkyCoord([150.0, 300.0], [-45.0, 45.0],
+                           frame='icrs', unit='deg')
+
+        for (radius, order) in ((0.5, 20), (2 * degree, 14)):
+            moc = catalog_to_moc(catalog, radius, order)
+            multi = catalog_to_moc(catalog, radius, order, multi_order=True)
+
+            self.assertEqual(multi.type, 'CATALOG')
+            self.assertTrue(multi.normalized)
+            self.assertEqual(multi.order, order)
+            self.assertEqual(multi, moc)
+
+        # Cells wholly within the discs are added at lower orders.
+        self.assertLess(len(multi[order]), len(moc[order]) // 4)
+
+    def test_catalog_chunks(self):
+        ra = np.linspace(0.0, 23.5, 40)
+        dec = np.linspace(-80.0, 80.0, 40)
+
+        tmpdir = mkdtemp()
+        try:
+            for (format_, header) in (
+                    ('commented_header', ['# RA Dec', '# A comment']),
+                    ('basic', ['# A comment', 'RA Dec'])):
+                filename = os.path.join(tmpdir, 'catalog.txt')
+                with open(filename, 'w') as f:
+                    for line in header:
+                        f.write(line + '\n')
+                    for (i, (ra_i, dec_i)) in enumerate(zip(ra, dec)):
+                        if i == 20:
+                            f.write('# Another comment\n')
+                        f.write('{0} {1}\n'.format(ra_i, dec_i))
+
+                catalog = read_ascii_catalog(filename, format_)
+                expected = catalog_to_moc(catalog, 1800, 10)
+
+                for chunk_size in (7, 21, 100):
+                    chunks = list(read_ascii_catalog_chunks(
+                        filename, format_, chunk_size=chunk_size))
+                    self.assertEqual(sum(len(x) for x in chunks), 40)
+
+                    moc = catalog_chunks_to_moc(chunks, 1800, 10)
+                    self.assertEqual(moc.type, 'CATALOG')
+                    self.assertEqual(moc, expected)
+
+                moc = catalog_chunks_to_moc(
+                    read_ascii_catalog_chunks(filename, format_, chunk_size=8),
+                    1800, 10, multi_order=True)
+                self.assertEqual(moc, expected)
+                self.assertTrue(moc.normalized)
+
+                pools = []
+
+                def counting_pool(*args, **kwargs):
+                    pool = Pool(*args, **kwargs)
+                    pools.append(pool)
+                    return pool
+
+                with patch('pymoc.util.catalog.Pool', counting_pool):
+                    moc = catalog_chunks_to_moc(
+                        read_ascii_catalog_chunks(
+                            filename, format_, chunk_size=7),
+                        1800, 10, workers=2)
+
+                self.assertEqual(moc, expected)
+                self.assertEqual(len(pools), 1)
+
+        finally:
+            rmtree(tmpdir)
+
+    def test_filter(self):
+        # MOC containing the cell at order 8 at the first position
+        # and the cell at order 5 at the third position.
+        moc = MOC(8, (480012,))
+        moc.add(5, (1678,))
+
+        catalog = SkyCoord(
+            [303.75, 303.50, 100.0, 200.0, 303.75],
+            [-4.18152827, -4.18152827, 40.0, 60.0, -4.18152827],
+            frame='icrs', unit='deg')
+
+        expect = [True, False, True, False, True]
+
+        self.assertEqual(filter_catalog(moc, catalog).tolist(), expect)
+        self.assertEqual(
+            filter_catalog(moc, catalog, chunk_size=3).tolist(), expect)
+        self.assertEqual(
+            filter_catalog(moc, catalog, indices=True).tolist(), [0, 2, 4])
+
+        # Same catalog given as arrays, and in galactic coordinates.
+        self.assertEqual(filter_catalog(
+            moc, (catalog.ra.degree, catalog.dec.degree)).tolist(), expect)
+        self.assertEqual(filter_catalog(
+            moc, (catalog.ra.to(radian), catalog.dec)).tolist(), expect)
+        self.assertEqual(
+            filter_catalog(moc, catalog.galactic).tolist(), expect)
+
+        self.assertEqual(filter_catalog(moc, catalog[0]).tolist(), [True])
@@ -0,0 +1,80 @@
+# Copyright (C) 2026 East Asian Observatory.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+from shutil import rmtree
+from tempfile import mkdtemp
+from unittest import TestCase
+
+from pymoc import MOC
+from pymoc.io.compression import compression_from_contents, \
+    compression_from_name
+from pymoc.io.fits import write_moc_fits
+
+
+class CompressionTestCase(TestCase):
+    def setUp(self):
+        self.tmpdir = mkdtemp()
+
+    def tearDown(self):
+        rmtree(self.tmpdir)
+
+    def test_compression(self):
+        orig = MOC()
+        orig.add(8, [10, 11, 12, 500])
+        orig.add(12, range(1000, 1100))
+
+        for (compression, extension) in (
+                ('gzip', '.gz'), ('bz2', '.bz2'), ('xz', '.xz')):
+            for filetype in ('fits', 'json', 'txt'):
+                filename = os.path.join(
+                    self.tmpdir, 'test.' + filetype + extension)
+
+                orig.write(filename)
+
+                self.assertEqual(
+                    compression_from_contents(filename), compression)
+
+                copy = MOC(filename=filename)
+                self.assertEqual(copy, orig)
+
+                # Check the type can be guessed from the decompressed
+                # contents of a file with a non-standard name.
+                renamed = os.path.join(self.tmpdir, 'test.dat')
+                os.rename(filename, renamed)
+
+                copy = MOC(filename=renamed)
+                self.assertEqual(copy, orig)
+
+        with self.assertRaises(ValueError):
+            write_moc_fits(orig, os.path.join(self.tmpdir, 'test.fits.gz'),
+                           chunk_size=10)
+
+        # Binary files can not be written compressed.
+        for extension in ('.gz', '.bz2', '.xz'):
+            filename = os.path.join(self.tmpdir, 'test.bmoc' + extension)
+
+            with self.assertRaises(ValueError):
+                orig.write(filename)
+
+            self.assertFalse(os.path.exists(filename))
+
+    def test_compression_name(self):
+        self.assertEqual(compression_from_name('test.json.GZ'),
+                         ('test.json', 'gzip'))
+        self.assertEqual(compression_from_name('test.txt.xz'),
+                         ('test.txt', 'xz'))
+        self.assertEqual(compression_from_name('test.fits'),
+                         ('test.fits', None))
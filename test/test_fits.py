@@ -13,10 +13,18 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+from io import BytesIO
+import os
+from shutil import rmtree
+from tempfile import mkdtemp
 from unittest import TestCase
 
+from astropy.io import fits
+
 from pymoc import MOC
-from pymoc.io.fits import read_moc_fits_hdu, write_moc_fits_hdu
+from pymoc.io.fits import read_moc_fits, read_moc_fits_hdu, \
+    read_moc_fits_multi, \
+    write_moc_fits, write_moc_fits_hdu, write_moc_fits_multi
 
 
 class FITSTestCase(TestCase):
@@ -34,6 +42,199 @@ class FITSTestCase(TestCase):
         self.assertEqual(copy[10], frozenset([5, 6, 7, 8]))
         self.assertEqual(copy[11], frozenset([1000, 1001, 2000]))
 
+    def test_fits_file_chunked(self):
+        orig = MOC()
+        orig.add(8, [10, 11, 12, 500])
+        orig.add(9, range(0, 40, 3))
+        orig.add(12, [99999, 100000])
+
+        tmpdir = mkdtemp()
+        try:
+            filename = os.path.join(tmpdir, 'test.fits')
+            write_moc_fits(orig, filename)
+
+            for chunk_size in (None, 1, 3, 100):
+                copy = MOC()
+                read_moc_fits(copy, filename, chunk_size=chunk_size)
+
+                self.assertEqual(copy, orig)
+                self.assertEqual(copy[9], orig[9])
+                self.assertEqual(copy[12], orig[12])
+
+        finally:
+            rmtree(tmpdir)
+
+    def test_fits_file_streaming(self):
+        orig = MOC()
+        orig.add(8, [10, 11, 12, 500])
+        orig.add(16, range(1000, 1100))
+
+        tmpdir = mkdtemp()
+        try:
+            filename = os.path.join(tmpdir, 'test.fits')
+
+            for chunk_size in (1, 7, 1000):
+                write_moc_fits(orig, filename, chunk_size=chunk_size,
+                               overwrite=True)
+
+                copy = MOC()
+                read_moc_fits(copy, filename)
+
+                self.assertEqual(copy, orig)
+                self.assertEqual(copy[16], orig[16])
+
+            with self.assertRaises(IOError):
+                write_moc_fits(orig, filename, chunk_size=10)
+
+        finally:
+            rmtree(tmpdir)
+
+    def test_fits_range(self):
+        orig = MOC()
+        orig.add(10, [5, 6, 7, 8])
+        orig.add(11, [1000, 1001, 2000])
+        orig.add(29, [3458700000000000000])
+
+        hdu = write_moc_fits_hdu(orig, ordering='RANGE')
+        self.assertEqual(hdu.header['ORDERING'], 'RANGE')
+        self.assertEqual(hdu.header['MOCORDER'], 29)
+        self.assertIn('K', hdu.header['TFORM1'])
+        self.assertEqual(hdu.data.field(0).tolist(),
+                         orig.to_ranges().ravel().tolist())
+
+        copy = MOC()
+        read_moc_fits_hdu(copy, hdu)
+
+        self.assertEqual(copy.order, 29)
+        self.assertEqual(copy[10], frozenset([5, 6, 7, 8]))
+        self.assertEqual(copy[11], frozenset([1000, 1001, 2000]))
+        self.assertEqual(copy[29], frozenset([3458700000000000000]))
+
+        tmpdir = mkdtemp()
+        try:
+            filename = os.path.join(tmpdir, 'test.fits')
+
+            for chunk_size in (None, 1, 3, 100):
+                write_moc_fits(orig, filename, ordering='range',
+                               chunk_size=chunk_size, overwrite=True)
+
+                for read_chunk_size in (None, 1, 2, 5):
+                    copy = MOC()
+                    read_moc_fits(copy, filename, chunk_size=read_chunk_size)
+                    self.assertEqual(copy, orig)
+
+        finally:
+            rmtree(tmpdir)
+
+        with self.assertRaises(ValueError):
+            write_moc_fits_hdu(orig, ordering='NESTED')
+
+    def test_fits_open(self):
+        orig = MOC(name='test-moc', mocid='ivo://TEST/...', moctype='image')
+        orig.add(10, [5, 6, 7, 8])
+        orig.add(11, [1000, 1001, 2000])
+
+        tmpdir = mkdtemp()
+        try:
+            filename = os.path.join(tmpdir, 'test.fits')
+            write_moc_fits(orig, filename)
+
+            moc = MOC.open(filename)
+
+            # Remove the file to check that the cells are not
+            # needed to determine the metadata, order and number of cells.
+            os.rename(filename, filename + '.tmp')
+
+            self.assertEqual(moc.name, 'test-moc')
+            self.assertEqual(moc.id, 'ivo://TEST/...')
+            self.assertEqual(moc.type, 'IMAGE')
+            self.assertEqual(moc.order, 11)
+            self.assertEqual(moc.cells, 7)
+
+            with self.assertRaises(IOError):
+                moc.area
+
+            os.rename(filename + '.tmp', filename)
+
+            self.assertEqual(moc, orig)
+            self.assertEqual(moc[11], frozenset([1000, 1001, 2000]))
+
+            # Check that cells added before the file is read are retained
+            # and that the header values are no longer used.
+            moc = MOC.open(filename)
+            moc.add(12, [0])
+            self.assertEqual(moc.order, 12)
+            self.assertEqual(moc.cells, 8)
+            self.assertEqual(moc, orig + MOC(12, [0]))
+
+            # The header values of files from other software should not
+            # be used, since they may not match the cells.
+            for header_order in (8, 14):
+                with fits.open(filename, mode='update') as hl:
+                    del hl[1].header['MOCTOOL']
+                    hl[1].header['MOCORDER'] = header_order
+
+                moc = MOC.open(filename)
+                self.assertEqual(moc.name, 'test-moc')
+                self.assertEqual(moc.order, 11)
+                self.assertEqual(moc.cells, 7)
+
+                moc = MOC.open(filename)
+                out = BytesIO()
+                moc.write(out, filetype='ascii')
+                self.assertEqual(out.getvalue(), b'10/5-8 11/1000,1001,2000')
+
+                write_moc_fits(orig, filename, overwrite=True)
+
+        finally:
+            rmtree(tmpdir)
+
+    def test_fits_multi(self):
+        mocs = [
+            MOC(order=5, cells=range(i * 10, i * 10 + i + 1),
+                name='moc-{0}'.format(i), mocid='ivo://TEST/{0}'.format(i))
+            for i in range(0, 5)]
+
+        tmpdir = mkdtemp()
+        try:
+            filename = os.path.join(tmpdir, 'test.fits')
+            write_moc_fits_multi(mocs, filename)
+
+            copies = read_moc_fits_multi(filename)
+            self.assertEqual(len(copies), 5)
+            for (copy, orig) in zip(copies, mocs):
+                self.assertEqual(copy, orig)
+                self.assertEqual(copy.name, orig.name)
+                self.assertEqual(copy.id, orig.id)
+
+            copies = read_moc_fits_multi(
+                filename, extnames=['moc-1'], mocids=['ivo://TEST/3'])
+            self.assertEqual([x.name for x in copies], ['moc-1', 'moc-3'])
+            self.assertEqual(copies[1], mocs[3])
+
+            copy = MOC()
+            read_moc_fits(copy, filename, extname='moc-2')
+            self.assertEqual(copy, mocs[2])
+
+            copy = MOC()
+            read_moc_fits(copy, filename, mocid='ivo://TEST/4')
+            self.assertEqual(copy, mocs[4])
+
+            with self.assertRaises(KeyError):
+                read_moc_fits(MOC(), filename, extname='moc-5')
+
+            copy = MOC.open(filename, extname='moc-3')
+            self.assertEqual(copy.name, 'moc-3')
+            self.assertEqual(copy.cells, 4)
+            self.assertEqual(copy, mocs[3])
+
+            copy = MOC(filename=filename)
+            self.assertEqual(copy.name, 'moc-0')
+            self.assertEqual(copy, mocs[0])
+
+        finally:
+            rmtree(tmpdir)
+
     def test_fits_large_32(self):
         orig = MOC()
         orig.add(13, [805306367])
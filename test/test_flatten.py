@@ -38,3 +38,14 @@ class FlattenTestCase(TestCase):
 
         self.assertEqual(q.flattened(5),
                          set((44, 45, 46, 47, 48, 49, 50, 51, 55)))
+
+        # Cells at the maximum order.
+        r = MOC(29, (1, 5))
+
+        self.assertEqual(r.flattened(), set((1, 5)))
+        self.assertEqual(r.flattened(29, False), set((1, 5)))
+
+        r.add(28, (0,))
+
+        self.assertEqual(r.flattened(), set((0, 1, 2, 3, 5)))
+        self.assertEqual(r.flattened(28), set((0, 1)))
@@ -20,6 +20,7 @@ from io import BytesIO
 from unittest import TestCase
 
 from pymoc import MOC
+import pymoc.io.json
 from pymoc.io.json import read_moc_json, write_moc_json
 
 
@@ -76,3 +77,67 @@ class JSONTestCase(TestCase):
         self.assertEqual(copy[29], frozenset([
             3458700000000000000, 3458700000000000007,
             3458700000000000008, 3458700000000000009]))
+
+    def test_json_chunks(self):
+        test_json = (b'{"1":[1,2,4],"10":[100,200,300,1000],'
+                     b'"2":[12,13,14,21,23,25]}')
+        expect = MOC()
+        read_moc_json(expect, file=BytesIO(test_json))
+
+        sizes = (pymoc.io.json.read_buffer_size,
+                 pymoc.io.json.read_batch_size,
+                 pymoc.io.json.write_chunk_size)
+        try:
+            for size in (1, 2, 3, 5, 7):
+                pymoc.io.json.read_buffer_size = size
+                pymoc.io.json.read_batch_size = size
+                pymoc.io.json.write_chunk_size = size
+
+                moc = MOC()
+                read_moc_json(moc, file=BytesIO(test_json))
+                self.assertEqual(repr(moc), repr(expect))
+
+                out = BytesIO()
+                write_moc_json(moc, file=out)
+                self.assertEqual(out.getvalue(), test_json)
+
+        finally:
+            (pymoc.io.json.read_buffer_size,
+             pymoc.io.json.read_batch_size,
+             pymoc.io.json.write_chunk_size) = sizes
+
+    def test_json_whitespace(self):
+        in_ = BytesIO(b'{\n  "3": [\n    7,\n    8\n  ],\n  "4": [ 1 ]\n}\n')
+
+        moc = MOC()
+        read_moc_json(moc, file=in_)
+
+        self.assertEqual(moc[3], frozenset([7, 8]))
+        self.assertEqual(moc[4], frozenset([1]))
+
+        for text in (b'{"3":7}', b'{"3":[7,"8"]}', b'{[7]}'):
+            with self.assertRaises(ValueError):
+                read_moc_json(MOC(), file=BytesIO(text))
+
+    def test_json_empty(self):
+        out = BytesIO()
+        write_moc_json(MOC(), file=out)
+        self.assertEqual(out.getvalue(), b'{}')
+
+        moc = MOC()
+        read_moc_json(moc, file=BytesIO(out.getvalue()))
+        self.assertEqual(moc.cells, 0)
+
+    def test_json_numbers(self):
+        in_ = BytesIO(b'{"3":[7.0,8E0,1e1],"4":[-0.0,2.000]}')
+
+        moc = MOC()
+        read_moc_json(moc, file=in_)
+
+        self.assertEqual(moc[3], frozenset([7, 8, 10]))
+        self.assertEqual(moc[4], frozenset([0, 2]))
+
+        for text in (b'{"3":[7.5]}', b'{"3":[1e-1]}', b'{"3":[x]}',
+                     b'{"3":[NaN]}'):
+            with self.assertRaises(ValueError):
+                read_moc_json(MOC(), file=BytesIO(text))
@@ -15,6 +15,8 @@
 
 from unittest import TestCase
 
+import numpy as np
+
 from pymoc import MOC
 
 
@@ -48,3 +50,24 @@ class NormalizeTestCase(TestCase):
         self.assertEqual(m[8], frozenset([0]))
         self.assertEqual(m[9], frozenset())
         self.assertEqual(m[10], frozenset())
+
+    def test_max_order(self):
+        m = MOC(12, set([1, 100]))
+        m.add(11, set([7]))
+
+        m.normalize(max_order=10)
+
+        self.assertEqual(m.order, 10)
+        self.assertEqual(m[10], frozenset([0, 1, 6]))
+        self.assertEqual(m[11], frozenset())
+        self.assertEqual(m[12], frozenset())
+
+    def test_large(self):
+        m = MOC(10, np.arange(0, 12 * 4 ** 10))
+        m.add(29, set([0]))
+
+        m.normalize()
+
+        self.assertEqual(m.order, 0)
+        self.assertEqual(m[0], frozenset(range(0, 12)))
+        self.assertEqual(m.cells, 12)
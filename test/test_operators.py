@@ -15,6 +15,8 @@
 
 from unittest import TestCase
 
+import numpy as np
+
 from pymoc import MOC
 
 
@@ -72,6 +74,83 @@ class OperatorsTestCase(TestCase):
         self.assertEqual(m.contains(0, 7, True), True)
         self.assertEqual(m.contains(0, 7, False), False)
 
+    def test_contains_many(self):
+        m = MOC()
+        m.add(0, (10, 11))
+        m.add(1, (36, 37))
+        m.add(2, (128, 129))
+        m.add(3, (448, 499))
+
+        for order in range(0, 5):
+            cells = np.arange(0, 12 * 4 ** order)
+
+            for include_smaller in (False, True):
+                expect = [m.contains(order, cell, include_smaller)
+                          for cell in cells]
+
+                result = m.contains_many(order, cells, include_smaller)
+
+                self.assertEqual(result.dtype, np.bool_)
+                self.assertEqual(result.tolist(), expect)
+
+        result = m.contains_many(1, np.array([[40, 41], [0, 1]]))
+        self.assertEqual(result.tolist(), [[True, True], [False, False]])
+
+        # Check results are updated when the MOC is modified.
+        self.assertFalse(m.contains(0, 0, True))
+        m.add(5, (0,))
+        self.assertTrue(m.contains(0, 0, True))
+        self.assertEqual(m.contains_many(5, (0, 1)).tolist(), [True, False])
+
+        with self.assertRaises(ValueError):
+            m.contains_many(1, (48,))
+
+    def test_contains_empty(self):
+        m = MOC()
+
+        for include_smaller in (False, True):
+            self.assertFalse(m.contains(3, 1, include_smaller))
+            self.assertEqual(
+                m.contains_many(3, (1, 2), include_smaller).tolist(),
+                [False, False])
+
+        # MOC which has become empty.
+        m.add(5, (1,))
+        m.remove(5, (1,))
+        self.assertFalse(m.contains(3, 0, True))
+        self.assertEqual(m.contains_many(3, (), True).tolist(), [])
+
+    def test_contains_incremental(self):
+        # Alternately add and test cells, as a flood-fill might.
+        m = MOC(10, range(0, 200000, 2))
+        expect = set(range(0, 200000, 2))
+        self.assertTrue(m.contains(10, 0))
+
+        merged = m._orders[10]
+
+        for i in range(0, 500):
+            cell = (i * 7919) % 300000
+            m.add(10, (cell,))
+            expect.add(cell)
+
+            for test in (cell, cell + 1, (i * 104729) % 300000):
+                self.assertEqual(m.contains(10, test), test in expect)
+
+            self.assertTrue(m.contains(8, cell // 16, True))
+
+        # Ranges added need not be sorted or disjoint.
+        m.add_ranges(10, [(250004, 250008), (250000, 250006)])
+        expect.update(range(250000, 250008))
+        self.assertTrue(m.contains(10, 250002))
+        self.assertTrue(m.contains(10, 250007))
+
+        # The main range set should not have been re-merged.
+        self.assertIs(m._orders[10], merged)
+
+        self.assertEqual(m[10], frozenset(expect))
+        self.assertEqual(m.contains_many(10, sorted(expect)).tolist(),
+                         [True] * len(expect))
+
     def test_copy(self):
         # TODO: check metadata copying
 
@@ -114,11 +193,38 @@ class OperatorsTestCase(TestCase):
         self.assertEqual(sorted(s[4]), [11, 12, 13])
         self.assertEqual(sorted(s[5]), [100, 101])
 
+    def test_add_buffer(self):
+        # Reusing an array after adding it should not alter the MOC.
+        for no_validation in (False, True):
+            m = MOC()
+            buff = np.empty(3, dtype=np.int64)
+
+            buff[:] = [1, 2, 3]
+            m.add(5, buff, no_validation=no_validation)
+
+            buff[:] = [10, 11, 12]
+            m.add(5, buff, no_validation=no_validation)
+
+            buff[:] = [20, 21, 22]
+            self.assertEqual(sorted(m[5]), [1, 2, 3, 10, 11, 12])
+
     def test_remove(self):
         m = MOC(4, (10, 11, 12, 13))
         m.remove(4, (10, 13))
         self.assertEqual(m, MOC(4, (11, 12)))
 
+    def test_remove_bulk(self):
+        m = MOC(0, (0, 1))
+        m.remove(8, np.arange(0, 4 ** 8, 2))
+
+        self.assertFalse(m.normalized)
+        self.assertEqual(m, MOC(8, range(1, 4 ** 8, 2)) + MOC(0, (1,)))
+        self.assertEqual(m[0], frozenset((1,)))
+        self.assertEqual(m.cells, 1 + 4 ** 8 // 2)
+
+        m.remove(0, (0,))
+        self.assertEqual(m, MOC(0, (1,)))
+
     def test_isub(self):
         p = MOC(1, (3, 4, 5))
         p -= MOC(1, (4,))
@@ -138,6 +244,13 @@ class OperatorsTestCase(TestCase):
 
         self.assertEqual(d, MOC(2, (16, 17, 18)))
 
+        # Check larger cells are only broken up where necessary.
+        d = MOC(0, (0, 1)) - MOC(3, (0,))
+        self.assertEqual(d[0], frozenset((1,)))
+        self.assertEqual(d[1], frozenset((1, 2, 3)))
+        self.assertEqual(d[2], frozenset((1, 2, 3)))
+        self.assertEqual(d[3], frozenset((1, 2, 3)))
+
     def test_intersection(self):
         p = MOC(4, (10, 11, 12))
         q = MOC(4, (9, 11, 13))
@@ -203,3 +316,20 @@ class OperatorsTestCase(TestCase):
         i = q.intersection(p)
         self.assertFalse(i.normalized)
         self.assertEqual(i, expect)
+
+    def test_intersection_large(self):
+        p = MOC(10, range(0, 25000))
+        q = MOC(12, range(200000, 600000))
+        q.add(8, (3,))
+
+        expect = MOC(12, range(200000, 400000))
+        expect.add(10, range(48, 64))
+
+        i = p.intersection(q)
+        self.assertEqual(i, expect)
+        self.assertEqual(i[10], frozenset(range(48, 64)))
+        self.assertEqual(i[12], frozenset(range(200000, 400000)))
+
+        i = q.intersection(p)
+        self.assertEqual(i, expect)
+        self.assertEqual(i.cells, 200016)
@@ -0,0 +1,142 @@
+# Copyright (C) 2026 East Asian Observatory.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from random import sample
+from unittest import TestCase
+
+from pymoc import MOC
+from pymoc.ranges import \
+    cells_to_ranges, merge_ranges, \
+    ranges_difference, ranges_intersection, ranges_length, \
+    ranges_to_cells, ranges_union
+
+
+class RangesTestCase(TestCase):
+    def test_cells(self):
+        ranges = cells_to_ranges(29, [7, 3, 4, 5, 10, 4])
+        self.assertEqual(ranges.tolist(), [[3, 6], [7, 8], [10, 11]])
+        self.assertEqual(ranges_length(ranges), 5)
+        self.assertEqual(ranges_to_cells(29, ranges).tolist(),
+                         [3, 4, 5, 7, 10])
+
+        ranges = cells_to_ranges(28, [1, 2])
+        self.assertEqual(ranges.tolist(), [[4, 12]])
+        self.assertEqual(ranges_to_cells(28, ranges).tolist(), [1, 2])
+        self.assertEqual(ranges_to_cells(29, ranges).tolist(),
+                         list(range(4, 12)))
+
+        ranges = cells_to_ranges(0, [11])
+        self.assertEqual(ranges.tolist(), [[11 << 58, 12 << 58]])
+
+        self.assertEqual(cells_to_ranges(10, []).shape, (0, 2))
+        self.assertEqual(ranges_to_cells(10, cells_to_ranges(10, [])).size, 0)
+
+    def test_merge(self):
+        ranges = merge_ranges([[5, 5], [10, 20], [0, 3], [3, 4], [12, 14]])
+        self.assertEqual(ranges.tolist(), [[0, 4], [10, 20]])
+
+        self.assertEqual(merge_ranges([]).shape, (0, 2))
+
+    def test_operations(self):
+        for i in range(0, 20):
+            a = set(sample(range(0, 200), 60))
+            b = set(sample(range(0, 200), 60))
+
+            ranges_a = cells_to_ranges(29, list(a))
+            ranges_b = cells_to_ranges(29, list(b))
+
+            for (ranges, expect) in (
+                    (ranges_union(ranges_a, ranges_b), a | b),
+                    (ranges_intersection(ranges_a, ranges_b), a & b),
+                    (ranges_difference(ranges_a, ranges_b), a - b),
+                    (ranges_difference(ranges_b, ranges_a), b - a)):
+                self.assertEqual(set(ranges_to_cells(29, ranges).tolist()),
+                                 expect)
+
+                # Check the result is in the expected form: sorted,
+                # disjoint and non-adjacent.
+                self.assertEqual(ranges.tolist(),
+                                 cells_to_ranges(29, list(expect)).tolist())
+
+    def test_moc_storage(self):
+        # Check that cells at different orders are kept separately
+        # until the MOC is normalized.
+        m = MOC(1, (4, 5, 6, 7))
+        m.add(2, (16, 17))
+        m.add(2, (17, 18))
+
+        self.assertEqual(m.cells, 7)
+        self.assertEqual(m[1], frozenset((4, 5, 6, 7)))
+        self.assertEqual(m[2], frozenset((16, 17, 18)))
+        self.assertEqual(
+            repr(m), '<MOC: [(1, [4, 5, 6, 7]), (2, [16, 17, 18])]>')
+
+        m.normalize()
+
+        self.assertEqual(m.cells, 1)
+        self.assertEqual(repr(m), '<MOC: [(0, [1])]>')
+
+        with self.assertRaises(ValueError):
+            m.add(0, (12,))
+
+        with self.assertRaises(ValueError):
+            m.add(29, (2 ** 70,))
+
+        with self.assertRaises(TypeError):
+            m.add(3, ('x',))
+
+    def test_moc_ranges(self):
+        m = MOC(1, (4, 5, 6, 7, 9))
+        m.add(3, (200, 201))
+
+        ranges = m.to_ranges()
+        self.assertEqual(ranges.tolist(), cells_to_ranges(
+            3, list(range(64, 128)) + list(range(144, 160)) + [200, 201]
+        ).tolist())
+
+        copy = MOC.from_ranges(ranges[::-1])
+        self.assertEqual(copy, m)
+        self.assertEqual(
+            repr(copy), '<MOC: [(0, [1]), (1, [9]), (3, [200, 201])]>')
+
+        self.assertEqual(MOC.from_ranges([]).cells, 0)
+
+        with self.assertRaises(ValueError):
+            MOC.from_ranges([[0, 13 << 58]])
+
+    def test_moc_add_ranges(self):
+        m = MOC()
+        m.add_ranges(3, [(10, 13), (20, 21), (12, 15), (30, 30)])
+        m.add_ranges(3, [])
+        m.add(3, [16])
+
+        self.assertEqual(m[3], frozenset([10, 11, 12, 13, 14, 16, 20]))
+        self.assertEqual(m.get_ranges(3).tolist(),
+                         [[10, 15], [16, 17], [20, 21]])
+        self.assertEqual(m.get_ranges(4).shape, (0, 2))
+        self.assertFalse(m.normalized)
+
+        m.add_ranges(29, [(0, 12 * 4 ** 29)])
+        m.normalize()
+        self.assertEqual(m.cells, 12)
+
+        with self.assertRaises(ValueError):
+            m.add_ranges(0, [(11, 13)])
+
+        with self.assertRaises(ValueError):
+            m.add_ranges(0, [(-1, 1)])
+
+        with self.assertRaises(TypeError):
+            m.add_ranges(0, [('x', 1)])
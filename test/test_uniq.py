@@ -0,0 +1,87 @@
+# Copyright (C) 2026 East Asian Observatory.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from unittest import TestCase
+
+import numpy as np
+
+from pymoc import MOC
+
+
+class UNIQTestCase(TestCase):
+    def test_uniq(self):
+        orig = MOC()
+        orig.add(0, [11])
+        orig.add(10, [5, 6, 7, 8])
+        orig.add(11, [1000, 1001, 2000])
+        orig.add(29, [3458700000000000000])
+
+        uniq = orig.to_uniq()
+
+        self.assertEqual(uniq.dtype, np.int64)
+        self.assertEqual(uniq.tolist(), [
+            15,
+            4 * 4 ** 10 + 5, 4 * 4 ** 10 + 6,
+            4 * 4 ** 10 + 7, 4 * 4 ** 10 + 8,
+            4 * 4 ** 11 + 1000, 4 * 4 ** 11 + 1001, 4 * 4 ** 11 + 2000,
+            4 * 4 ** 29 + 3458700000000000000,
+        ])
+
+        copy = MOC.from_uniq(uniq[::-1])
+
+        self.assertEqual(copy.order, 29)
+        self.assertEqual(copy[0], frozenset([11]))
+        self.assertEqual(copy[10], frozenset([5, 6, 7, 8]))
+        self.assertEqual(copy[11], frozenset([1000, 1001, 2000]))
+        self.assertEqual(copy[29], frozenset([3458700000000000000]))
+
+    def test_uniq_empty(self):
+        uniq = MOC().to_uniq()
+
+        self.assertEqual(uniq.dtype, np.int64)
+        self.assertEqual(uniq.size, 0)
+
+        self.assertEqual(MOC.from_uniq(uniq).cells, 0)
+
+    def test_uniq_limits(self):
+        # Check the first and last value at each order.
+        for order in range(0, 30):
+            moc = MOC.from_uniq([4 * 4 ** order, 16 * 4 ** order - 1])
+
+            self.assertEqual(moc.order, order)
+            self.assertEqual(moc[order], frozenset([0, 12 * 4 ** order - 1]))
+
+        for uniq in (3, 16 * 4 ** 29):
+            with self.assertRaises(ValueError):
+                MOC.from_uniq([uniq])
+
+    def test_iter_uniq(self):
+        orig = MOC()
+        orig.add(3, [1, 2, 3, 10])
+        orig.add(12, range(100, 200))
+        orig.add(12, range(300, 305))
+
+        uniq = orig.to_uniq()
+
+        for chunk_size in (1, 2, 3, 50, 104, 1000):
+            chunks = list(orig.iter_uniq(chunk_size))
+
+            self.assertTrue(all(0 < x.size <= chunk_size for x in chunks))
+            self.assertEqual(np.concatenate(chunks).tolist(), uniq.tolist())
+
+        self.assertEqual(list(MOC().iter_uniq(10)), [])
+
+        with self.assertRaises(ValueError):
+            list(orig.iter_uniq(0))